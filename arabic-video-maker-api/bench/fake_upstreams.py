@@ -0,0 +1,121 @@
+"""خادم وهمي لـ ElevenLabs وStable Diffusion لاختبار الحمل دون اتصال بالخدمات الحقيقية
+
+    python bench/fake_upstreams.py --port 5900 --latency 0.3 --error-rate 0.01 --rate-limit-rate 0.02
+"""
+import time
+import random
+import argparse
+import itertools
+import threading
+
+from flask import Flask, Response, jsonify, request
+
+# إطار MP3 صامت: MPEG-1 Layer III بمعدل 128kbps و44.1kHz، ومدته 1152 عينة
+FRAME_HEADER = bytes([0xFF, 0xFB, 0x90, 0x64])
+FRAME_SIZE = 417
+FRAME_SECONDS = 1152 / 44100
+SILENT_FRAME = FRAME_HEADER + bytes(FRAME_SIZE - len(FRAME_HEADER))
+# تقريب لسرعة النطق العربي
+SECONDS_PER_CHAR = 0.065
+
+CLIP_BYTES = bytes(256 * 1024)
+
+
+def create_app(latency=0.2, jitter=0.5, error_rate=0.0, rate_limit_rate=0.0, video_ready=2.0):
+    app = Flask(__name__)
+    ids = itertools.count(1)
+    created = {}
+    lock = threading.Lock()
+
+    def delay(scale=1.0):
+        # زمن استجابة عشوائي حول المتوسط المطلوب
+        time.sleep(max(0.0, latency * scale * random.uniform(1 - jitter, 1 + jitter)))
+
+    def failure():
+        roll = random.random()
+        if roll < rate_limit_rate:
+            return jsonify({"detail": "rate limited"}), 429, {"Retry-After": "1"}
+        if roll < rate_limit_rate + error_rate:
+            return jsonify({"detail": "upstream error"}), 500
+        return None
+
+    def audio_for(text):
+        frames = max(1, int(len(text) * SECONDS_PER_CHAR / FRAME_SECONDS))
+        return SILENT_FRAME * frames
+
+    @app.post("/v1/text-to-speech/<voice_id>")
+    def text_to_speech(voice_id):
+        delay()
+        error = failure()
+        if error:
+            return error
+        return Response(audio_for(request.get_json()["text"]), mimetype="audio/mpeg")
+
+    @app.post("/v1/text-to-speech/<voice_id>/stream")
+    def text_to_speech_stream(voice_id):
+        delay(0.3)
+        error = failure()
+        if error:
+            return error
+        audio = audio_for(request.get_json()["text"])
+
+        def generate():
+            for start in range(0, len(audio), 16 * FRAME_SIZE):
+                time.sleep(latency * 0.05)
+                yield audio[start:start + 16 * FRAME_SIZE]
+
+        return Response(generate(), mimetype="audio/mpeg")
+
+    @app.post("/text2video")
+    def text2video():
+        delay()
+        error = failure()
+        if error:
+            return error
+        job_id = next(ids)
+        with lock:
+            created[job_id] = time.monotonic()
+        return jsonify({"status": "processing", "id": job_id, "eta": video_ready, "fetch_result": f"{request.host_url}fetch/{job_id}"})
+
+    @app.post("/fetch/<int:job_id>")
+    def fetch(job_id):
+        delay(0.2)
+        error = failure()
+        if error:
+            return error
+        with lock:
+            started = created.get(job_id)
+        if started is None:
+            return jsonify({"status": "error", "message": "unknown job"})
+        if time.monotonic() - started < video_ready:
+            return jsonify({"status": "processing", "eta": 1})
+        return jsonify({"status": "success", "output": [f"{request.host_url}clips/{job_id}.mp4"]})
+
+    @app.get("/clips/<int:job_id>.mp4")
+    def clip(job_id):
+        return Response(CLIP_BYTES, mimetype="video/mp4")
+
+    @app.get("/health")
+    def health():
+        return jsonify({"ok": True})
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5900)
+    parser.add_argument("--latency", type=float, default=0.2, help="متوسط زمن الاستجابة بالثواني")
+    parser.add_argument("--jitter", type=float, default=0.5, help="نسبة التذبذب حول المتوسط")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="نسبة ردود 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="نسبة ردود 429")
+    parser.add_argument("--video-ready", type=float, default=2.0, help="زمن تجهيز الفيديو بالثواني")
+    args = parser.parse_args()
+
+    app = create_app(args.latency, args.jitter, args.error_rate, args.rate_limit_rate, args.video_ready)
+    app.run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == "__main__":
+    main()
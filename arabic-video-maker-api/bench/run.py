@@ -0,0 +1,391 @@
+"""قياس أداء الـ API تحت الحمل مع خدمات خارجية وهمية
+
+يشغّل src.main:app على gunicorn وخادماً وهمياً لـ ElevenLabs وStable Diffusion،
+ثم يرسل مزيجاً من الطلبات ويطبع p50/p95/p99 والإنتاجية وتشبع العمال بصيغة JSON.
+
+    pip install -r bench/requirements.txt
+    python bench/run.py --duration 60 --concurrency 32 --workers 2 --threads 8 --output result.json
+    python bench/run.py --baseline result.json --max-regression 0.2
+"""
+import os
+import sys
+import json
+import math
+import time
+import random
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+from collections import defaultdict
+
+import requests
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STATIC_DIR = os.path.join(API_DIR, "src", "static")
+
+DEFAULT_MIX = "projects=35,tts=30,video=10,static=25"
+
+# جمل قصيرة تتكرر أحياناً لتمرين ذاكرة الصوت، وتُركّب عشوائياً لتوليد نصوص جديدة
+SENTENCES = [
+    "مرحبا بكم في قناتنا.",
+    "اليوم نتحدث عن تاريخ القهوة العربية!",
+    "هل جربتم القهوة بالهيل؟",
+    "القاهرة مدينة لا تنام.",
+    "تابعونا للمزيد من الفيديوهات.",
+    "السوق القديم مليء بالروائح والألوان.",
+    "شكراً على المشاهدة، وإلى اللقاء.",
+    "هذه وصفة سهلة وسريعة للعشاء.",
+]
+DIALECTS = ["egyptian", "gulf", "levantine", "maghrebi"]
+VOICES = ["male1", "female1"]
+
+
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = defaultdict(list)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+
+    def record(self, operation, seconds, status):
+        with self._lock:
+            self.samples[operation].append(seconds)
+            self.statuses[operation][str(status)] += 1
+
+
+def percentile(values, q):
+    """الرتبة الأقرب على قائمة مرتبة"""
+    if not values:
+        return None
+    index = max(0, min(len(values) - 1, math.ceil(q / 100 * len(values)) - 1))
+    return values[index]
+
+
+def latency_summary(values):
+    values = sorted(values)
+    if not values:
+        return {}
+    return {
+        "p50": round(percentile(values, 50) * 1000, 2),
+        "p95": round(percentile(values, 95) * 1000, 2),
+        "p99": round(percentile(values, 99) * 1000, 2),
+        "max": round(values[-1] * 1000, 2),
+        "mean": round(sum(values) / len(values) * 1000, 2),
+    }
+
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        if name not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f"unknown operation: {name}")
+        mix[name] = float(weight)
+    return mix
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_until_ready(url, timeout=60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(url, timeout=2).ok:
+                return
+        except requests.exceptions.RequestException:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} did not become ready")
+
+
+def random_text(rng, unique_rate):
+    count = rng.randint(1, 4)
+    text = " ".join(rng.sample(SENTENCES, count))
+    if rng.random() < unique_rate:
+        # رقم عشوائي يجعل النص جديداً فيُطلب من الخدمة بدل الذاكرة
+        text += f" رقم {rng.randint(1, 10 ** 9)}."
+    return text
+
+
+# كل عملية ترجع قائمة (اسم، زمن، حالة، جسم الرد) لأن بعضها يتكون من أكثر من طلب
+def op_projects(session, base, rng, options):
+    if rng.random() < 0.5:
+        return [timed(session, "projects_list", "GET", f"{base}/api/projects", params={"limit": 20})]
+    payload = {"text": random_text(rng, 1.0), "dialect": rng.choice(DIALECTS), "voice": rng.choice(VOICES)}
+    return [timed(session, "projects_create", "POST", f"{base}/api/projects", json=payload)]
+
+
+def op_tts(session, base, rng, options):
+    payload = {"text": random_text(rng, options.tts_unique_rate), "voice": rng.choice(VOICES)}
+    return [timed(session, "tts_preview", "POST", f"{base}/api/tts/preview", json=payload)]
+
+
+def op_video(session, base, rng, options):
+    payload = {"text": random_text(rng, 1.0), "dialect": rng.choice(DIALECTS), "voice": rng.choice(VOICES)}
+    created = timed(session, "projects_create", "POST", f"{base}/api/projects", json=payload)
+    results = [created]
+    if created[3] is not None:
+        project_id = created[3]["project"]["id"]
+        generated = timed(session, "video_generate", "POST", f"{base}/api/video/generate", json={"project_id": project_id})
+        results.append(generated)
+        if generated[3] is not None and generated[3].get("status_url"):
+            results.append(timed(session, "video_status", "GET", f"{base}{generated[3]['status_url']}"))
+    return results
+
+
+def op_static(session, base, rng, options):
+    path = rng.choice(options.static_paths)
+    return [timed(session, "static", "GET", f"{base}/{path}", headers={"Accept-Encoding": "br, gzip"})]
+
+
+OPERATIONS = {"projects": op_projects, "tts": op_tts, "video": op_video, "static": op_static}
+
+
+def timed(session, name, method, url, **kwargs):
+    started = time.perf_counter()
+    try:
+        response = session.request(method, url, timeout=120, **kwargs)
+        response.content
+        status = response.status_code
+        body = response.json() if response.ok and response.headers.get("Content-Type", "").startswith("application/json") else None
+    except requests.exceptions.RequestException as e:
+        status, body = type(e).__name__, None
+    return name, time.perf_counter() - started, status, body
+
+
+def drive(base, options, recorder, deadline, seed):
+    rng = random.Random(seed)
+    operations = list(options.mix)
+    weights = [options.mix[name] for name in operations]
+    with requests.Session() as session:
+        while time.monotonic() < deadline:
+            operation = OPERATIONS[rng.choices(operations, weights)[0]]
+            for name, seconds, status, _ in operation(session, base, rng, options):
+                recorder.record(name, seconds, status)
+
+
+def sample_saturation(base, stop, samples, interval):
+    """قراءة المقاييس دورياً؛ كل قراءة مجمعة من كل العمال عبر METRICS_DIR"""
+    with requests.Session() as session:
+        while not stop.wait(interval):
+            try:
+                text = session.get(f"{base}/api/metrics", timeout=5).text
+            except requests.exceptions.RequestException:
+                continue
+            values = {}
+            for line in text.splitlines():
+                name, _, value = line.rpartition(" ")
+                if name in ("http_requests_in_flight", "video_jobs_pending"):
+                    values[name] = float(value)
+            if "http_requests_in_flight" in values:
+                # نستبعد طلب القراءة نفسه
+                values["http_requests_in_flight"] -= 1
+                samples.append(values)
+
+
+def static_paths():
+    paths = [""]
+    assets = os.path.join(STATIC_DIR, "assets")
+    if os.path.isdir(assets):
+        paths += [f"assets/{name}" for name in sorted(os.listdir(assets))]
+    return paths
+
+
+def start_servers(options, workdir):
+    upstream_port = free_port()
+    upstream = subprocess.Popen([
+        sys.executable, os.path.join(API_DIR, "bench", "fake_upstreams.py"),
+        "--port", str(upstream_port),
+        "--latency", str(options.upstream_latency),
+        "--error-rate", str(options.error_rate),
+        "--rate-limit-rate", str(options.rate_limit_rate),
+        "--video-ready", str(options.video_ready),
+    ], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    upstream_url = f"http://127.0.0.1:{upstream_port}"
+
+    api_port = free_port()
+    env = dict(
+        os.environ,
+        DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        # صوت الخادم الوهمي الصامت لا يدخل ذاكرة الصوت الحقيقية
+        TTS_CACHE_DIR=os.path.join(workdir, "tts"),
+        RENDER_DIR=os.path.join(workdir, "renders"),
+        METRICS_DIR=os.path.join(workdir, "metrics"),
+        ELEVENLABS_API_KEY="bench",
+        ELEVENLABS_API_URL=f"{upstream_url}/v1/text-to-speech",
+        STABLE_DIFFUSION_API_KEY="bench",
+        STABLE_DIFFUSION_API_URL=f"{upstream_url}/text2video",
+        STABLE_DIFFUSION_FETCH_URL=f"{upstream_url}/fetch",
+        VIDEO_POLL_INTERVAL="1",
+        LOG_LEVEL=options.log_level,
+    )
+    api = subprocess.Popen([
+        sys.executable, "-m", "gunicorn", "src.main:app",
+        "--bind", f"127.0.0.1:{api_port}",
+        "--workers", str(options.workers),
+        "--worker-class", "gthread",
+        "--threads", str(options.threads),
+        "--timeout", "120",
+        # مهام الفيديو في الخلفية لا تنتهي قبل الإيقاف فلا ننتظرها طويلاً
+        "--graceful-timeout", "5",
+        "--log-level", "warning",
+    ], cwd=API_DIR, env=env, stdout=subprocess.DEVNULL, stderr=open(os.path.join(workdir, "gunicorn.log"), "wb"))
+
+    base = f"http://127.0.0.1:{api_port}"
+    try:
+        wait_until_ready(f"{upstream_url}/health")
+        wait_until_ready(f"{base}/api/dialects")
+    except RuntimeError:
+        stop_servers(upstream, api)
+        raise
+    return base, upstream, api
+
+
+def stop_servers(*processes):
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        try:
+            process.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def build_report(options, recorder, elapsed, samples):
+    operations = {}
+    total = errors = 0
+    all_samples = []
+    for name in sorted(recorder.samples):
+        values = recorder.samples[name]
+        statuses = dict(recorder.statuses[name])
+        failed = sum(count for status, count in statuses.items() if not (status.isdigit() and int(status) < 400))
+        total += len(values)
+        errors += failed
+        all_samples += values
+        operations[name] = {
+            "requests": len(values),
+            "errors": failed,
+            "throughput_rps": round(len(values) / elapsed, 2),
+            "latency_ms": latency_summary(values),
+            "statuses": statuses,
+        }
+
+    # المقاييس مجمعة من كل العمال، فالسعة هي خيوط كل العمال معاً
+    capacity = options.workers * options.threads
+    in_flight = [s["http_requests_in_flight"] for s in samples]
+    pending = [s.get("video_jobs_pending", 0) for s in samples]
+    return {
+        "config": {
+            "duration_s": options.duration,
+            "concurrency": options.concurrency,
+            "workers": options.workers,
+            "threads": options.threads,
+            "mix": options.mix,
+            "upstream_latency_s": options.upstream_latency,
+            "error_rate": options.error_rate,
+            "rate_limit_rate": options.rate_limit_rate,
+        },
+        "elapsed_s": round(elapsed, 2),
+        "requests": total,
+        "errors": errors,
+        "throughput_rps": round(total / elapsed, 2),
+        "latency_ms": latency_summary(all_samples),
+        "operations": operations,
+        "saturation": {
+            "samples": len(samples),
+            "threads_total": capacity,
+            "in_flight_mean": round(sum(in_flight) / len(in_flight), 2) if in_flight else None,
+            "in_flight_max": max(in_flight) if in_flight else None,
+            # نسبة الخيوط المشغولة في المتوسط
+            "utilization": round(sum(in_flight) / len(in_flight) / capacity, 3) if in_flight else None,
+            "video_jobs_pending_max": max(pending) if pending else None,
+        },
+    }
+
+
+def compare(report, baseline, max_regression):
+    """مقارنة p95 لكل عملية بالقياس المرجعي وإرجاع العمليات التي تباطأت أكثر من الحد"""
+    regressions = []
+    for name, current in report["operations"].items():
+        previous = baseline.get("operations", {}).get(name)
+        if not previous or not previous.get("latency_ms") or not current.get("latency_ms"):
+            continue
+        before, after = previous["latency_ms"]["p95"], current["latency_ms"]["p95"]
+        if before and after > before * (1 + max_regression):
+            regressions.append({"operation": name, "p95_before_ms": before, "p95_after_ms": after})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duration", type=float, default=30.0, help="مدة الحمل بالثواني")
+    parser.add_argument("--warmup", type=float, default=3.0, help="مدة التسخين قبل القياس")
+    parser.add_argument("--concurrency", type=int, default=16, help="عدد العملاء المتزامنين")
+    parser.add_argument("--workers", type=int, default=2, help="عمال gunicorn")
+    parser.add_argument("--threads", type=int, default=8, help="خيوط كل عامل")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX), help=f"أوزان العمليات، الافتراضي {DEFAULT_MIX}")
+    parser.add_argument("--tts-unique-rate", type=float, default=0.3, help="نسبة نصوص الصوت الجديدة التي لا توجد في الذاكرة")
+    parser.add_argument("--upstream-latency", type=float, default=0.2)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--video-ready", type=float, default=2.0)
+    parser.add_argument("--sample-interval", type=float, default=0.5)
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="ملف لحفظ النتيجة")
+    parser.add_argument("--baseline", help="نتيجة سابقة للمقارنة")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="أقصى زيادة مسموحة في p95")
+    options = parser.parse_args()
+    options.static_paths = static_paths()
+
+    with tempfile.TemporaryDirectory(prefix="bench-") as workdir:
+        base, upstream, api = start_servers(options, workdir)
+        try:
+            if options.warmup > 0:
+                drive_all(base, options, Recorder(), options.warmup, options.seed + 10 ** 6)
+
+            recorder = Recorder()
+            samples = []
+            stop = threading.Event()
+            sampler = threading.Thread(target=sample_saturation, args=(base, stop, samples, options.sample_interval), daemon=True)
+            sampler.start()
+            started = time.monotonic()
+            drive_all(base, options, recorder, options.duration, options.seed)
+            elapsed = time.monotonic() - started
+            stop.set()
+            sampler.join()
+        finally:
+            stop_servers(api, upstream)
+
+    report = build_report(options, recorder, elapsed, samples)
+    if options.baseline:
+        with open(options.baseline, encoding="utf-8") as f:
+            report["regressions"] = compare(report, json.load(f), options.max_regression)
+
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if options.output:
+        with open(options.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    print(output)
+    return 1 if report.get("regressions") else 0
+
+
+def drive_all(base, options, recorder, duration, seed):
+    deadline = time.monotonic() + duration
+    clients = [
+        threading.Thread(target=drive, args=(base, options, recorder, deadline, seed + index), daemon=True)
+        for index in range(options.concurrency)
+    ]
+    for client in clients:
+        client.start()
+    for client in clients:
+        client.join()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,13 +1,29 @@
 import os
 import sys
+import sqlite3
+import threading
 # DON'T CHANGE THIS !!!
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
-from flask import Flask, send_from_directory
+from flask import Flask, abort, request
 from flask_cors import CORS
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, make_url
 from src.models.user import db
 from src.routes.user import user_bp
 from src.routes.video import video_bp
+from src.routes.batch import batch_bp
+from src.routes.metrics import metrics_bp
+from src.services import jobs
+from src.services import batches
+from src.services import assembly
+from src.services import metrics
+from src.services.log import configure_logging
+from src.services.static_files import StaticIndex, serve_entry, serve_dynamic
+from src.services.tts_cache import audio_cache
+
+# سجلات JSON منظمة تُكتب من خيط منفصل
+configure_logging()
 
 app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
 app.config['SECRET_KEY'] = 'asdf#FGSgvasgf$5$WGT'
@@ -17,14 +33,70 @@ CORS(app)
 
 app.register_blueprint(user_bp, url_prefix='/api')
 app.register_blueprint(video_bp, url_prefix='/api')
+app.register_blueprint(batch_bp, url_prefix='/api')
+app.register_blueprint(metrics_bp, url_prefix='/api')
+
+# قياس زمن الطلبات ومراحلها وعرضها على /api/metrics
+metrics.init_app(app)
 
 # uncomment if you need to use database
-app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
+app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}")
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {'pool_pre_ping': True}
+database_url = make_url(app.config['SQLALCHEMY_DATABASE_URI'])
+if database_url.get_backend_name() == 'sqlite' and database_url.database not in (None, '', ':memory:') and database_url.query.get('mode') != 'memory':
+    # قاعدة SQLite في ملف: مجمع اتصالات يتشاركه الخيوط؛ قاعدة الذاكرة تستخدم StaticPool ولا تقبل هذه الخيارات
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'].update({
+        'pool_size': int(os.getenv('DB_POOL_SIZE', '10')),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', '20')),
+        'pool_timeout': 30,
+        'connect_args': {'timeout': 30, 'check_same_thread': False},
+    })
 db.init_app(app)
+
+@event.listens_for(Engine, "connect")
+def set_sqlite_pragma(dbapi_connection, connection_record):
+    """وضع WAL يسمح بالقراءة أثناء الكتابة بدل قفل قاعدة البيانات كلها"""
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA busy_timeout=30000")
+    cursor.close()
+
 with app.app_context():
     db.create_all()
 
+# مجموعة عمال إنتاج الفيديو والدفعات وتجميع الفيديو النهائي في الخلفية
+jobs.init_app(app)
+batches.init_app(app)
+assembly.init_app(app)
+
+# تنظيف ملفات الصوت المتروكة في الخلفية حتى لا يتأخر إقلاع العامل
+threading.Thread(target=audio_cache.remove_stale, name="tts-cleanup", daemon=True).start()
+
+# فهرس الملفات الثابتة في الذاكرة مع نسخ مضغوطة مسبقاً
+static_index = StaticIndex(app.static_folder)
+# مع كل مجلد الامتداد الوحيد المسموح بإرساله، فملفات النص والبيانات والملفات المؤقتة بجانبه لا تُعرض
+dynamic_roots = {'tts': (audio_cache.directory, '.mp3'), 'renders': (os.path.abspath(assembly.RENDER_DIR), '.mp4')}
+
+def serve_static(filename):
+    entry = static_index.get(filename)
+    if entry is not None:
+        return serve_entry(entry, request)
+    # مجلدات الصوت والفيديو النهائي يمكن نقلها خارج static عبر متغيرات البيئة
+    prefix, _, rest = filename.partition('/')
+    if prefix in dynamic_roots:
+        root, extension = dynamic_roots[prefix]
+        if not rest.endswith(extension):
+            abort(404)
+        return serve_dynamic(root, rest, filename)
+    return serve_dynamic(app.static_folder, filename)
+
+# استبدال مسار /static/ الافتراضي في Flask
+app.view_functions['static'] = serve_static
+
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
 def serve(path):
@@ -32,14 +104,12 @@ def serve(path):
     if static_folder_path is None:
             return "Static folder not configured", 404
 
-    if path != "" and os.path.exists(os.path.join(static_folder_path, path)):
-        return send_from_directory(static_folder_path, path)
-    else:
-        index_path = os.path.join(static_folder_path, 'index.html')
-        if os.path.exists(index_path):
-            return send_from_directory(static_folder_path, 'index.html')
-        else:
+    entry = static_index.get(path) if path != "" else None
+    if entry is None:
+        entry = static_index.get('index.html')
+        if entry is None:
             return "index.html not found", 404
+    return serve_entry(entry, request)
 
 
 if __name__ == '__main__':
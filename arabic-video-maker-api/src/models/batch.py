@@ -0,0 +1,89 @@
+import time
+from src.models.user import db
+
+# حالات الدفعة
+BATCH_QUEUED = "queued"
+BATCH_RUNNING = "running"
+BATCH_COMPLETED = "completed"
+
+# حالات عناصر الدفعة
+ITEM_QUEUED = "queued"
+ITEM_SYNTHESIZING = "synthesizing"
+ITEM_GENERATING = "generating"
+ITEM_COMPLETED = "completed"
+ITEM_FAILED = "failed"
+
+ITEM_TERMINAL_STATES = (ITEM_COMPLETED, ITEM_FAILED)
+
+
+class Batch(db.Model):
+    __tablename__ = "batches"
+
+    id = db.Column(db.String(36), primary_key=True)
+    status = db.Column(db.String(16), nullable=False, default=BATCH_QUEUED, index=True)
+    total = db.Column(db.Integer, nullable=False)
+    concurrency = db.Column(db.Integer, nullable=False)
+    generate_video = db.Column(db.Boolean, nullable=False, default=True)
+    created_at = db.Column(db.Float, nullable=False, default=time.time)
+    updated_at = db.Column(db.Float, nullable=False, default=time.time, onupdate=time.time)
+
+    def __repr__(self):
+        return f'<Batch {self.id} {self.status}>'
+
+    def to_dict(self, counts=None):
+        counts = counts or {}
+        done = counts.get(ITEM_COMPLETED, 0) + counts.get(ITEM_FAILED, 0)
+        return {
+            'id': self.id,
+            'status': self.status,
+            'total': self.total,
+            'concurrency': self.concurrency,
+            'generate_video': self.generate_video,
+            'counts': counts,
+            'progress': round(100 * done / self.total) if self.total else 100,
+            'created_at': self.created_at,
+            'updated_at': self.updated_at
+        }
+
+
+class BatchItem(db.Model):
+    __tablename__ = "batch_items"
+
+    id = db.Column(db.String(36), primary_key=True)
+    batch_id = db.Column(db.String(36), db.ForeignKey("batches.id"), nullable=False)
+    position = db.Column(db.Integer, nullable=False)
+    project_id = db.Column(db.String(36), nullable=False)
+    status = db.Column(db.String(16), nullable=False, default=ITEM_QUEUED)
+    audio_url = db.Column(db.String(1024))
+    duration = db.Column(db.Float)
+    job_id = db.Column(db.String(36))
+    video_url = db.Column(db.String(1024))
+    error = db.Column(db.Text)
+    finished_at = db.Column(db.Float)
+
+    __table_args__ = (
+        db.Index("ix_batch_items_batch_id_position", "batch_id", "position"),
+        db.Index("ix_batch_items_batch_id_status", "batch_id", "status"),
+    )
+
+    def __repr__(self):
+        return f'<BatchItem {self.batch_id}#{self.position} {self.status}>'
+
+    @property
+    def is_done(self):
+        return self.status in ITEM_TERMINAL_STATES
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'batch_id': self.batch_id,
+            'position': self.position,
+            'project_id': self.project_id,
+            'status': self.status,
+            'audio_url': self.audio_url,
+            'duration': self.duration,
+            'job_id': self.job_id,
+            'video_url': self.video_url,
+            'error': self.error,
+            'finished_at': self.finished_at
+        }
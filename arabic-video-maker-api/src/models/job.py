@@ -0,0 +1,50 @@
+import time
+from src.models.user import db
+
+# حالات المهمة
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+
+TERMINAL_STATES = (JOB_COMPLETED, JOB_FAILED)
+
+
+class VideoJob(db.Model):
+    __tablename__ = "video_jobs"
+
+    id = db.Column(db.String(36), primary_key=True)
+    project_id = db.Column(db.String(36), nullable=False, index=True)
+    # مقاطع الفيديو النهائي تتبع تصييرها ولا تغير حالة المشروع
+    render_id = db.Column(db.String(36), index=True)
+    prompt = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(16), nullable=False, default=JOB_QUEUED, index=True)
+    progress = db.Column(db.Integer, nullable=False, default=0)
+    # معرف المهمة لدى Stable Diffusion ورابط متابعتها عند رد "processing"
+    upstream_id = db.Column(db.String(64))
+    fetch_url = db.Column(db.String(512))
+    video_url = db.Column(db.String(1024))
+    error = db.Column(db.Text)
+    created_at = db.Column(db.Float, nullable=False, default=time.time)
+    updated_at = db.Column(db.Float, nullable=False, default=time.time, onupdate=time.time)
+
+    def __repr__(self):
+        return f'<VideoJob {self.id} {self.status}>'
+
+    @property
+    def is_done(self):
+        return self.status in TERMINAL_STATES
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'project_id': self.project_id,
+            'render_id': self.render_id,
+            'status': self.status,
+            'progress': self.progress,
+            'upstream_id': self.upstream_id,
+            'video_url': self.video_url,
+            'error': self.error,
+            'created_at': self.created_at,
+            'updated_at': self.updated_at
+        }
@@ -0,0 +1,34 @@
+import time
+from src.models.user import db
+
+
+class Project(db.Model):
+    __tablename__ = "projects"
+
+    id = db.Column(db.String(36), primary_key=True)
+    text = db.Column(db.Text, nullable=False)
+    dialect = db.Column(db.String(32))
+    voice = db.Column(db.String(32))
+    status = db.Column(db.String(16), nullable=False, default="draft")
+    video_url = db.Column(db.String(1024))
+    created_at = db.Column(db.Float, nullable=False, default=time.time)
+
+    __table_args__ = (
+        # ترتيب القائمة بالأحدث مع فلترة الحالة يستخدم هذين الفهرسين دون فرز
+        db.Index("ix_projects_created_at_id", "created_at", "id"),
+        db.Index("ix_projects_status_created_at_id", "status", "created_at", "id"),
+    )
+
+    def __repr__(self):
+        return f'<Project {self.id}>'
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'text': self.text,
+            'dialect': self.dialect,
+            'voice': self.voice,
+            'status': self.status,
+            'video_url': self.video_url,
+            'created_at': self.created_at
+        }
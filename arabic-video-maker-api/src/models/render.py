@@ -0,0 +1,59 @@
+import json
+import time
+from src.models.user import db
+
+# مراحل تجميع الفيديو النهائي
+RENDER_QUEUED = "queued"
+RENDER_PLANNING = "planning"
+RENDER_GENERATING = "generating"
+RENDER_DOWNLOADING = "downloading"
+RENDER_MUXING = "muxing"
+RENDER_COMPLETED = "completed"
+RENDER_FAILED = "failed"
+
+RENDER_TERMINAL_STATES = (RENDER_COMPLETED, RENDER_FAILED)
+
+
+class Render(db.Model):
+    __tablename__ = "renders"
+
+    id = db.Column(db.String(36), primary_key=True)
+    project_id = db.Column(db.String(36), nullable=False, index=True)
+    status = db.Column(db.String(16), nullable=False, default=RENDER_QUEUED, index=True)
+    progress = db.Column(db.Integer, nullable=False, default=0)
+    # خطة المقاطع بصيغة JSON: نص كل قطعة ومدة صوتها ومعرف مهمة الفيديو الخاصة بها
+    plan = db.Column(db.Text)
+    duration = db.Column(db.Float)
+    video_url = db.Column(db.String(1024))
+    error = db.Column(db.Text)
+    created_at = db.Column(db.Float, nullable=False, default=time.time)
+    updated_at = db.Column(db.Float, nullable=False, default=time.time, onupdate=time.time)
+
+    def __repr__(self):
+        return f'<Render {self.id} {self.status}>'
+
+    @property
+    def is_done(self):
+        return self.status in RENDER_TERMINAL_STATES
+
+    @property
+    def clips(self):
+        return json.loads(self.plan) if self.plan else []
+
+    @clips.setter
+    def clips(self, value):
+        self.plan = json.dumps(value, ensure_ascii=False)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'project_id': self.project_id,
+            'status': self.status,
+            'progress': self.progress,
+            'clips': self.clips,
+            'duration': self.duration,
+            'video_url': self.video_url,
+            'error': self.error,
+            'created_at': self.created_at,
+            'updated_at': self.updated_at
+        }
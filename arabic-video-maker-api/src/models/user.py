@@ -2,6 +2,14 @@ from flask_sqlalchemy import SQLAlchemy
 
 db = SQLAlchemy()
 
+
+def save(row, **fields):
+    """تعديل حقول الصف وحفظها فوراً حتى تراها الطلبات والعمال الآخرون"""
+    for key, value in fields.items():
+        setattr(row, key, value)
+    db.session.commit()
+
+
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
@@ -0,0 +1,88 @@
+import os
+import json
+import time
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+from src.models.user import db
+from src.models.batch import BATCH_COMPLETED
+from src.services import batches
+from src.services import jobs
+
+batch_bp = Blueprint("batch", __name__)
+
+# الفاصل بين كل فحص لعناصر الدفعة أثناء بث النتائج
+RESULTS_POLL_INTERVAL = 0.5
+# أقصى مدة لبث النتائج في اتصال واحد؛ يمكن للعميل إعادة الاتصال بعدها
+RESULTS_TIMEOUT = float(os.getenv("BATCH_RESULTS_TIMEOUT", "3600"))
+
+@batch_bp.route("/batches", methods=["POST"])
+def create_batch():
+    """إنشاء دفعة من النصوص وتوليد الصوت والفيديو لها في الخلفية"""
+    data = request.get_json()
+
+    if not data or not isinstance(data.get("items"), list) or not data["items"]:
+        return jsonify({"success": False, "error": "قائمة النصوص مطلوبة"}), 400
+    if len(data["items"]) > batches.BATCH_MAX_ITEMS:
+        return jsonify({"success": False, "error": f"الحد الأقصى {batches.BATCH_MAX_ITEMS} نص في الدفعة الواحدة"}), 400
+
+    # اللهجة والصوت على مستوى الدفعة قيم افتراضية يمكن لكل عنصر تغييرها
+    scripts = []
+    for position, item in enumerate(data["items"]):
+        if not isinstance(item, dict) or not item.get("text"):
+            return jsonify({"success": False, "error": f"النص مطلوب في العنصر رقم {position + 1}"}), 400
+        voice = item.get("voice") or data.get("voice")
+        if not voice:
+            return jsonify({"success": False, "error": f"الصوت مطلوب في العنصر رقم {position + 1}"}), 400
+        scripts.append({"text": item["text"], "dialect": item.get("dialect") or data.get("dialect"), "voice": voice})
+
+    generate_video = bool(data.get("generate_video", True))
+    if generate_video and not jobs.STABLE_DIFFUSION_API_KEY:
+        return jsonify({"success": False, "error": "مفتاح Stable Diffusion API غير متوفر. يرجى إضافته في الإعدادات"}), 500
+
+    try:
+        concurrency = int(data.get("concurrency", batches.BATCH_DEFAULT_CONCURRENCY))
+    except (TypeError, ValueError):
+        return jsonify({"success": False, "error": "قيمة concurrency غير صحيحة"}), 400
+
+    batch = batches.create_batch(scripts, concurrency, generate_video)
+    return jsonify({
+        "success": True,
+        "batch": batch.to_dict(batches.item_counts(batch.id)),
+        "status_url": f"/api/batches/{batch.id}",
+        "results_url": f"/api/batches/{batch.id}/results"
+    }), 202
+
+@batch_bp.route("/batches/<batch_id>", methods=["GET"])
+def get_batch(batch_id):
+    """متابعة التقدم الإجمالي للدفعة"""
+    batch = batches.get_batch(batch_id)
+    if batch is None:
+        return jsonify({"success": False, "error": "الدفعة غير موجودة"}), 404
+
+    return jsonify({"success": True, "batch": batch.to_dict(batches.item_counts(batch_id))})
+
+@batch_bp.route("/batches/<batch_id>/results", methods=["GET"])
+def stream_batch_results(batch_id):
+    """بث نتيجة كل عنصر بصيغة NDJSON فور انتهائه"""
+    batch = batches.get_batch(batch_id)
+    if batch is None:
+        return jsonify({"success": False, "error": "الدفعة غير موجودة"}), 404
+    total = batch.total
+
+    def generate():
+        sent = set()
+        deadline = time.monotonic() + RESULTS_TIMEOUT
+        while len(sent) < total and time.monotonic() < deadline:
+            # الحالة تُقرأ قبل العناصر حتى لا يفوتنا عنصر انتهى مع نهاية الدفعة
+            batch_done = batches.get_batch(batch_id).status == BATCH_COMPLETED
+            items = batches.finished_items(batch_id, sent)
+            # إنهاء المعاملة لإعادة الاتصال إلى المجمع بين كل فحص
+            db.session.commit()
+            for item in items:
+                sent.add(item.position)
+                yield json.dumps(item.to_dict(), ensure_ascii=False) + "\n"
+            if batch_done:
+                break
+            if len(sent) < total:
+                time.sleep(RESULTS_POLL_INTERVAL)
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson", headers={"Cache-Control": "no-store"})
@@ -0,0 +1,34 @@
+from flask import Blueprint, Response
+from src.services import jobs
+from src.services import metrics
+from src.services import upstream
+from src.services.tts_cache import audio_cache
+
+metrics_bp = Blueprint("metrics", __name__)
+
+BREAKER_STATES = {"closed": 0, "half_open": 1, "open": 2}
+
+tts_cache_counter = metrics.register(metrics.Counter("tts_cache_events_total", "TTS audio cache events (hits, misses, evictions, inflight_waits).", ("event",)))
+# كل العمال يفهرسون نفس مجلد الصوت، فجمع أحجامهم يكرر العد
+tts_cache_disk_gauge = metrics.register(metrics.Gauge("tts_cache_disk", "TTS audio cache contents on disk (entries, bytes).", ("field",), aggregate=max))
+# القاطع مستقل في كل عامل، فنعرض أسوأ حالة بينها
+breaker_gauge = metrics.register(metrics.Gauge("upstream_circuit_state", "Circuit breaker state per provider: 0 closed, 1 half open, 2 open.", ("provider",), aggregate=max))
+video_jobs_gauge = metrics.register(metrics.Gauge("video_jobs_pending", "Video jobs queued or running."))
+
+
+@metrics.register_collector
+def collect():
+    for field, value in audio_cache.stats().items():
+        if field in ("entries", "bytes"):
+            tts_cache_disk_gauge.set(value, field=field)
+        elif field not in ("max_bytes", "max_age"):
+            tts_cache_counter.set(value, event=field)
+    for client in (upstream.elevenlabs, upstream.stable_diffusion, upstream.clip_downloads):
+        breaker_gauge.set(BREAKER_STATES[client.breaker.state], provider=client.name)
+    video_jobs_gauge.set(jobs.pending_count())
+
+
+@metrics_bp.route("/metrics", methods=["GET"])
+def get_metrics():
+    """مقاييس الخادم بصيغة Prometheus النصية، مجمعة من كل العمال إذا ضُبط METRICS_DIR"""
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
@@ -1,24 +1,64 @@
-import os
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, redirect, stream_with_context
 import time
 import uuid
+import json
+import base64
 import requests
+from sqlalchemy import and_, or_
+from src.models.user import db
+from src.models.project import Project
+from src.services import assembly
+from src.services import ffmpeg
+from src.services import jobs
+from src.services import tts
+from src.services import upstream
+from src.services.tts_cache import StreamInterrupted, audio_cache, is_valid_key
 
 video_bp = Blueprint("video", __name__)
 
-# محاكاة قاعدة بيانات للمشاريع
-projects_db = {}
-
-ELEVENLABS_API_KEY = os.getenv("ELEVENLABS_API_KEY")
-ELEVENLABS_API_URL = "https://api.elevenlabs.io/v1/text-to-speech"
-
-STABLE_DIFFUSION_API_KEY = os.getenv("STABLE_DIFFUSION_API_KEY")
-STABLE_DIFFUSION_API_URL = "https://stablediffusionapi.com/api/v5/text2video"
+PROJECTS_PAGE_SIZE = 20
+PROJECTS_MAX_PAGE_SIZE = 100
 
 @video_bp.route("/projects", methods=["GET"])
 def get_projects():
-    """الحصول على قائمة المشاريع"""
-    return jsonify({"success": True, "projects": list(projects_db.values())})
+    """الحصول على قائمة المشاريع مرتبة بالأحدث مع ترقيم الصفحات بالمؤشر والفلترة بالحالة"""
+    try:
+        limit = min(max(int(request.args.get("limit", PROJECTS_PAGE_SIZE)), 1), PROJECTS_MAX_PAGE_SIZE)
+    except ValueError:
+        return jsonify({"success": False, "error": "قيمة limit غير صحيحة"}), 400
+
+    query = Project.query
+    statuses = [s for s in request.args.get("status", "").split(",") if s]
+    if statuses:
+        query = query.filter(Project.status.in_(statuses))
+
+    cursor = request.args.get("cursor")
+    if cursor:
+        position = _decode_cursor(cursor)
+        if position is None:
+            return jsonify({"success": False, "error": "المؤشر غير صحيح"}), 400
+        created_at, project_id = position
+        query = query.filter(or_(
+            Project.created_at < created_at,
+            and_(Project.created_at == created_at, Project.id < project_id),
+        ))
+
+    rows = query.order_by(Project.created_at.desc(), Project.id.desc()).limit(limit + 1).all()
+    page = rows[:limit]
+    next_cursor = _encode_cursor(page[-1]) if len(rows) > limit else None
+
+    return jsonify({"success": True, "projects": [project.to_dict() for project in page], "next_cursor": next_cursor})
+
+def _encode_cursor(project):
+    raw = json.dumps([project.created_at, project.id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+def _decode_cursor(cursor):
+    try:
+        created_at, project_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return float(created_at), str(project_id)
+    except (ValueError, TypeError):
+        return None
 
 @video_bp.route("/projects", methods=["POST"])
 def create_project():
@@ -28,19 +68,18 @@ def create_project():
     if not data or not data.get("text"):  # Changed from 'text' to 'text'
         return jsonify({"success": False, "error": "النص مطلوب"}), 400
 
-    project_id = str(uuid.uuid4())
-    project = {
-        "id": project_id,
-        "text": data.get("text"),
-        "dialect": data.get("dialect"),
-        "voice": data.get("voice"),
-        "status": "draft",
-        "created_at": time.time(),
-    }
-
-    projects_db[project_id] = project
+    project = Project(
+        id=str(uuid.uuid4()),
+        text=data.get("text"),
+        dialect=data.get("dialect"),
+        voice=data.get("voice"),
+        status="draft",
+        created_at=time.time(),
+    )
+    db.session.add(project)
+    db.session.commit()
 
-    return jsonify({"success": True, "project": project})
+    return jsonify({"success": True, "project": project.to_dict()})
 
 @video_bp.route("/tts/preview", methods=["POST"])
 def preview_tts():
@@ -50,118 +89,153 @@ def preview_tts():
     if not data or not data.get("text") or not data.get("voice"):  # Added voice validation
         return jsonify({"success": False, "error": "النص والصوت مطلوبان"}), 400
 
-    text = data.get("text")
-    voice_id = data.get("voice")
+    tts_request = tts.build_request(data.get("text"), data.get("voice"))
+    key = tts.request_key(tts_request)
 
-    headers = {"xi-api-key": ELEVENLABS_API_KEY, "Content-Type": "application/json"}
-    payload = {"text": text, "model_id": "eleven_multilingual_v2", "voice_settings": {"stability": 0.5, "similarity_boost": 0.75}}
+    try:
+        if data.get("stream"):
+            # وضع البث: يبدأ المتصفح التشغيل من stream_url قبل اكتمال التوليد
+            cached = audio_cache.contains(key)
+            if not cached:
+                audio_cache.save_request(key, tts_request)
+            stream_url = audio_cache.url(key) if cached else f"/api/tts/stream/{key}"
+            # المدة غير معروفة قبل اكتمال البث
+            meta = audio_cache.metadata(key) if cached else {}
+            return jsonify({"success": True, "audio_url": audio_cache.url(key), "stream_url": stream_url, "cached": cached, **_audio_info(meta)})
 
-    # ElevenLabs voice mapping (example, you'll need to map your UI voices to ElevenLabs voice_ids)
-    # For now, I'll use a placeholder voice_id. You'll need to get actual voice_ids from ElevenLabs.
-    # This is a crucial step for proper integration.
-    # Example: if voice_id == 'male1': elevenlabs_voice_id = 'YOUR_MALE1_VOICE_ID'
-    # For demonstration, I'll use a generic voice ID if not found.
-    elevenlabs_voice_id = "21m00Tzpb8JJc4PzHMd8" # A generic male voice from ElevenLabs for testing
-    if voice_id == 'female1':
-        elevenlabs_voice_id = "EXAVITQu4vr4xnSDxMaL" # A generic female voice from ElevenLabs for testing
+        # الطلبات المتطابقة تعيد نفس الملف دون استدعاء ElevenLabs مرة أخرى
+        audio_url = tts.preview(tts_request)
 
-    try:
-        response = requests.post(f"{ELEVENLABS_API_URL}/{elevenlabs_voice_id}", headers=headers, json=payload)
-        response.raise_for_status()  # Raise an exception for HTTP errors
-
-        audio_filename = f"audio_preview_{uuid.uuid4()}.mp3"
-        static_dir = os.path.join(os.path.dirname(__file__), "..", "static")
-        
-        # إنشاء مجلد static إذا لم يكن موجوداً
-        if not os.path.exists(static_dir):
-            os.makedirs(static_dir)
-            
-        audio_path = os.path.join(static_dir, audio_filename)
-        with open(audio_path, "wb") as f:
-            f.write(response.content)
-
-        return jsonify({"success": True, "audio_url": f"/static/{audio_filename}", "duration": len(text) * 0.05}) # Placeholder duration
+        return jsonify({"success": True, "audio_url": audio_url, **_audio_info(audio_cache.metadata(key))})
 
     except requests.exceptions.RequestException as e:
-        return jsonify({"success": False, "error": f"خطأ في الاتصال بـ ElevenLabs: {str(e)}"}), 500
+        return _elevenlabs_error(e)
     except Exception as e:
         return jsonify({"success": False, "error": f"حدث خطأ: {str(e)}"}), 500
 
+def _audio_info(meta):
+    meta = meta or {}
+    return {"duration": meta.get("duration"), "bitrate": meta.get("bitrate"), "sample_rate": meta.get("sample_rate")}
+
+@video_bp.route("/tts/stream/<key>", methods=["GET"])
+def stream_tts(key):
+    """بث الصوت على دفعات أثناء توليده مع حفظه في الذاكرة"""
+    if not is_valid_key(key):
+        return jsonify({"success": False, "error": "طلب الصوت غير موجود"}), 404
+
+    if audio_cache.contains(key):
+        return redirect(audio_cache.url(key))
+
+    tts_request = audio_cache.load_request(key)
+    if tts_request is None:
+        return jsonify({"success": False, "error": "طلب الصوت غير موجود"}), 404
+
+    try:
+        chunks = tts.stream_to_cache(key, tts_request)
+    except requests.exceptions.RequestException as e:
+        return _elevenlabs_error(e)
+    except StreamInterrupted:
+        # أغلق صاحب البث الاتصال قبل أول دفعة فلم يكتمل شيء نتابعه
+        return jsonify({"success": False, "error": "انقطع توليد الصوت. يرجى المحاولة مرة أخرى"}), 503
+    if chunks is None:
+        # اكتمل توليده في طلب آخر أثناء انتظارنا
+        return redirect(audio_cache.url(key))
+
+    return Response(stream_with_context(chunks), mimetype="audio/mpeg", headers={"Cache-Control": "no-store"})
+
+def _elevenlabs_error(e):
+    """تحويل أخطاء ElevenLabs إلى رد مناسب بدلاً من 500 دائماً"""
+    if isinstance(e, (upstream.CircuitOpenError, upstream.UpstreamBusyError)):
+        return jsonify({"success": False, "error": "خدمة الصوت مشغولة حالياً. يرجى المحاولة لاحقاً"}), 503
+    if isinstance(e, requests.exceptions.HTTPError) and e.response is not None and e.response.status_code == 429:
+        return jsonify({"success": False, "error": "تم تجاوز حد الطلبات. يرجى المحاولة لاحقاً"}), 429
+    return jsonify({"success": False, "error": f"خطأ في الاتصال بـ ElevenLabs: {str(e)}"}), 500
+
+@video_bp.route("/tts/cache/stats", methods=["GET"])
+def get_tts_cache_stats():
+    """إحصائيات ذاكرة تخزين الصوت لضبط حجمها"""
+    return jsonify({"success": True, "cache": audio_cache.stats()})
+
 @video_bp.route("/video/generate", methods=["POST"])
 def generate_video():
-    """بدء عملية إنتاج الفيديو باستخدام Stable Diffusion API"""
+    """بدء عملية إنتاج الفيديو في الخلفية وإرجاع معرف المهمة فوراً"""
     data = request.get_json()
 
     if not data or not data.get("project_id"):
         return jsonify({"success": False, "error": "معرف المشروع مطلوب"}), 400
 
     project_id = data.get("project_id")
-    if project_id not in projects_db:
+    project = db.session.get(Project, project_id)
+    if project is None:
         return jsonify({"success": False, "error": "المشروع غير موجود"}), 404
 
-    project = projects_db[project_id]
-    text_prompt = project.get("text")
+    text_prompt = project.text
 
     if not text_prompt:
         return jsonify({"success": False, "error": "النص غير متوفر لإنشاء الفيديو"}), 400
 
     # التحقق من وجود مفتاح API
-    if not STABLE_DIFFUSION_API_KEY:
+    if not jobs.STABLE_DIFFUSION_API_KEY:
         return jsonify({"success": False, "error": "مفتاح Stable Diffusion API غير متوفر. يرجى إضافته في الإعدادات"}), 500
 
-    headers = {"Content-Type": "application/json"}
-    payload = {
-        "key": STABLE_DIFFUSION_API_KEY,
-        "prompt": f"high quality video of {text_prompt}, cinematic, professional",
-        "negative_prompt": "low quality, bad anatomy, blurry, deformed, disfigured, watermark, text",
-        "scheduler": "UniPCMultistepScheduler",
-        "seconds": 3,  # تقليل المدة لتوفير الوقت والتكلفة
-        "guidance_scale": 7.5,
-        "num_inference_steps": 20
-    }
-
     try:
-        print(f"Sending request to Stable Diffusion API with prompt: {text_prompt}")
-        response = requests.post(STABLE_DIFFUSION_API_URL, headers=headers, json=payload, timeout=60)
-        
-        print(f"Response status: {response.status_code}")
-        print(f"Response content: {response.text[:500]}...")  # أول 500 حرف للتشخيص
-        
-        if response.status_code == 401:
-            return jsonify({"success": False, "error": "مفتاح API غير صحيح أو منتهي الصلاحية"}), 500
-        elif response.status_code == 402:
-            return jsonify({"success": False, "error": "رصيد API غير كافي"}), 500
-        elif response.status_code == 429:
-            return jsonify({"success": False, "error": "تم تجاوز حد الطلبات. يرجى المحاولة لاحقاً"}), 500
-        
-        response.raise_for_status()
-        video_data = response.json()
-
-        if video_data.get("status") == "success" and video_data.get("output"):
-            video_url = video_data["output"][0]
-            project["video_url"] = video_url
-            project["status"] = "completed"
-            return jsonify({"success": True, "video_url": video_url, "status": "completed"})
-        elif video_data.get("status") == "processing":
-            # في حالة المعالجة، يمكن إرجاع معرف المهمة للمتابعة لاحقاً
-            return jsonify({"success": True, "status": "processing", "message": "الفيديو قيد المعالجة..."})
-        else:
-            error_msg = video_data.get("message", video_data.get("messege", "فشل في إنشاء الفيديو"))
-            return jsonify({"success": False, "error": f"خطأ من API: {error_msg}"}), 500
-
-    except requests.exceptions.Timeout:
-        return jsonify({"success": False, "error": "انتهت مهلة الاتصال مع خدمة إنشاء الفيديو"}), 500
-    except requests.exceptions.RequestException as e:
-        return jsonify({"success": False, "error": f"خطأ في الاتصال: {str(e)}"}), 500
-    except Exception as e:
-        print(f"Unexpected error: {str(e)}")
-        return jsonify({"success": False, "error": f"حدث خطأ غير متوقع: {str(e)}"}), 500
+        job = jobs.submit_video_job(project_id, text_prompt)
+    except jobs.QueueFullError:
+        return jsonify({"success": False, "error": "الخادم مشغول حالياً. يرجى المحاولة لاحقاً"}), 503
+
+    return jsonify({
+        "success": True,
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": f"/api/video/status/{job.id}",
+        "message": "الفيديو قيد المعالجة..."
+    }), 202
+
+@video_bp.route("/projects/<project_id>/render", methods=["POST"])
+def render_project(project_id):
+    """تجميع الفيديو النهائي: مقطع لكل جملة بطول صوتها ثم دمجها مع السرد"""
+    project = db.session.get(Project, project_id)
+    if project is None:
+        return jsonify({"success": False, "error": "المشروع غير موجود"}), 404
+    if not project.text:
+        return jsonify({"success": False, "error": "النص غير متوفر لإنشاء الفيديو"}), 400
+    if not jobs.STABLE_DIFFUSION_API_KEY:
+        return jsonify({"success": False, "error": "مفتاح Stable Diffusion API غير متوفر. يرجى إضافته في الإعدادات"}), 500
+    if not ffmpeg.available():
+        return jsonify({"success": False, "error": "ffmpeg غير مثبت على الخادم"}), 500
+
+    render = assembly.create_render(project)
+    return jsonify({
+        "success": True,
+        "render": render.to_dict(),
+        "status_url": f"/api/renders/{render.id}",
+        "message": "الفيديو النهائي قيد التجميع..."
+    }), 202
+
+@video_bp.route("/renders/<render_id>", methods=["GET"])
+def get_render(render_id):
+    """متابعة مراحل تجميع الفيديو النهائي"""
+    render = assembly.get_render(render_id)
+    if render is None:
+        return jsonify({"success": False, "error": "التصيير غير موجود"}), 404
+
+    return jsonify({"success": True, "render": render.to_dict()})
 
 @video_bp.route("/video/status/<job_id>", methods=["GET"])
 def get_video_status(job_id):
-    """متابعة حالة إنتاج الفيديو (محاكاة - لم تعد تستخدم بعد دمج Stable Diffusion)"""
-    # هذه الوظيفة لم تعد تستخدم بعد دمج Stable Diffusion API حيث أن API يوفر URL الفيديو مباشرة
-    return jsonify({"success": False, "error": "هذه الوظيفة لم تعد مدعومة"}), 400
+    """متابعة حالة إنتاج الفيديو"""
+    job = jobs.get_job(job_id)
+    if job is None:
+        return jsonify({"success": False, "error": "المهمة غير موجودة"}), 404
+
+    return jsonify({
+        "success": True,
+        "job_id": job.id,
+        "status": job.status,
+        "progress": job.progress,
+        "video_url": job.video_url,
+        "error": job.error
+    })
 
 @video_bp.route("/voices", methods=["GET"])
 def get_voices():
@@ -0,0 +1,176 @@
+import os
+import uuid
+import shutil
+import logging
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from src.models.user import db, save
+from src.models.project import Project
+from src.models.job import JOB_COMPLETED
+from src.models.render import (
+    Render, RENDER_PLANNING, RENDER_GENERATING, RENDER_DOWNLOADING, RENDER_MUXING,
+    RENDER_COMPLETED, RENDER_FAILED, RENDER_TERMINAL_STATES,
+)
+from src.services import ffmpeg
+from src.services import jobs
+from src.services import leases
+from src.services import metrics
+from src.services import tts
+from src.services.upstream import clip_downloads
+from src.services.tts_cache import audio_cache
+
+logger = logging.getLogger(__name__)
+
+RENDER_DIR = os.getenv("RENDER_DIR", os.path.join(os.path.dirname(__file__), "..", "static", "renders"))
+RENDER_URL = "/static/renders"
+RENDER_WORK_DIR = os.getenv("RENDER_WORK_DIR") or None
+
+# عدد عمليات ffmpeg المتزامنة، وعدد التصييرات التي تُدار معاً، وتوازي تنزيل المقاطع
+RENDER_FFMPEG_JOBS = int(os.getenv("RENDER_FFMPEG_JOBS", str(max(1, (os.cpu_count() or 2) // ffmpeg.FFMPEG_THREADS))))
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", "2"))
+RENDER_DOWNLOAD_WORKERS = int(os.getenv("RENDER_DOWNLOAD_WORKERS", "8"))
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+_app = None
+_executor = None
+_ffmpeg_executor = None
+_lease = leases.LeaseKeeper(Render, lambda: Render.status.notin_(RENDER_TERMINAL_STATES), lambda render_id: _lease.submit(_executor, _run_render, render_id))
+
+
+class RenderError(Exception):
+    """خطأ في إحدى مراحل التجميع يُعرض للمستخدم كما هو"""
+
+
+def init_app(app):
+    """تهيئة عمال التجميع وعمليات ffmpeg واستئناف التصييرات غير المكتملة"""
+    global _app, _executor, _ffmpeg_executor
+    _app = app
+    _executor = ThreadPoolExecutor(max_workers=RENDER_WORKERS, thread_name_prefix="render")
+    # ffmpeg يعمل في عملية منفصلة أصلاً، فالخيوط هنا تنتظره فقط وعددها يحد أوامر ffmpeg المتزامنة
+    _ffmpeg_executor = ThreadPoolExecutor(max_workers=RENDER_FFMPEG_JOBS, thread_name_prefix="ffmpeg")
+    with app.app_context():
+        leases.register(app, _lease)
+
+
+def create_render(project):
+    """تسجيل تصيير جديد للمشروع وجدولته دون انتظار"""
+    render = Render(id=str(uuid.uuid4()), project_id=project.id)
+    db.session.add(render)
+    project.status = "processing"
+    db.session.commit()
+    _lease.submit(_executor, _run_render, render.id)
+    return render
+
+
+def get_render(render_id):
+    return db.session.get(Render, render_id)
+
+
+def plan_clips(tts_request):
+    """مقطع لكل قطعة من النص، مدته مدة صوت القطعة المقاسة من ملفها"""
+    clips = []
+    start = 0.0
+    for chunk in tts.split_request(tts_request):
+        # القطع مولدة مسبقاً مع الصوت الكامل فهذا يقرأ من الذاكرة عادة
+        tts.preview(chunk)
+        meta = audio_cache.metadata(tts.request_key(chunk)) or {}
+        if not meta.get("duration"):
+            raise RenderError("تعذر قياس مدة الصوت")
+        clips.append({"text": chunk["text"], "start": round(start, 3), "duration": meta["duration"], "job_id": None})
+        start += meta["duration"]
+    return clips
+
+
+def _run_render(render_id):
+    metrics.current_route.set("render")
+    with _app.app_context():
+        render = db.session.get(Render, render_id)
+        if render is None or render.is_done:
+            return
+        project = db.session.get(Project, render.project_id)
+        workdir = tempfile.mkdtemp(prefix=f"render-{render_id[:8]}-", dir=RENDER_WORK_DIR)
+        try:
+            _execute(render, project, workdir)
+        except (RenderError, jobs.JobError, ffmpeg.FfmpegError) as e:
+            db.session.rollback()
+            save(render, status=RENDER_FAILED, error=str(e))
+        except requests.exceptions.RequestException as e:
+            db.session.rollback()
+            save(render, status=RENDER_FAILED, error=f"خطأ في الاتصال: {str(e)}")
+        except Exception as e:
+            logger.exception("render %s crashed", render_id)
+            db.session.rollback()
+            save(render, status=RENDER_FAILED, error=f"حدث خطأ غير متوقع: {str(e)}")
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+        Project.query.filter_by(id=render.project_id).update({"status": render.status, "video_url": render.video_url})
+        db.session.commit()
+
+
+def _execute(render, project, workdir):
+    tts_request = tts.build_request(project.text, project.voice)
+
+    if not render.plan:
+        save(render, status=RENDER_PLANNING, progress=5)
+        tts.preview(tts_request)
+        clips = plan_clips(tts_request)
+        total = (audio_cache.metadata(tts.request_key(tts_request)) or {}).get("duration") or sum(c["duration"] for c in clips)
+        # المقطع الأخير يمتص فروق التقريب حتى يطابق طول الفيديو طول السرد
+        clips[-1]["duration"] = max(round(total - clips[-1]["start"], 3), 0.1)
+        render.clips = clips
+        save(render, duration=total, progress=15)
+
+    save(render, status=RENDER_GENERATING)
+    clips = render.clips
+    for clip in clips:
+        if not clip["job_id"]:
+            clip["job_id"] = jobs.submit_video_job(render.project_id, clip["text"], render_id=render.id, wait=True).id
+            render.clips = clips
+            db.session.commit()
+
+    # المهام تعمل معاً في طابور الفيديو، فننتظرها بالترتيب
+    urls = []
+    for index, clip in enumerate(clips):
+        job = jobs.wait_for_job(clip["job_id"])
+        if job is None or job.status != JOB_COMPLETED:
+            raise RenderError(f"فشل توليد المقطع رقم {index + 1}: {job.error if job is not None else 'المهمة غير موجودة'}")
+        urls.append(job.video_url)
+        save(render, progress=15 + int(45 * (index + 1) / len(clips)))
+
+    save(render, status=RENDER_DOWNLOADING)
+    sources = [os.path.join(workdir, f"clip-{index}.mp4") for index in range(len(clips))]
+    with ThreadPoolExecutor(max_workers=RENDER_DOWNLOAD_WORKERS, thread_name_prefix=f"render-{render.id[:8]}") as pool:
+        list(pool.map(metrics.propagate(_download), urls, sources))
+
+    save(render, status=RENDER_MUXING, progress=70)
+    segments = [os.path.join(workdir, f"segment-{index}.mp4") for index in range(len(clips))]
+    futures = [
+        _ffmpeg_executor.submit(ffmpeg.fit_segment, source, segment, clip["duration"])
+        for source, segment, clip in zip(sources, segments, clips)
+    ]
+    for future in futures:
+        future.result()
+
+    # قد يكون الصوت أُخلي من الذاكرة أثناء انتظار المقاطع
+    tts.preview(tts_request)
+    os.makedirs(RENDER_DIR, exist_ok=True)
+    target = os.path.join(RENDER_DIR, f"{render.id}.mp4")
+    _ffmpeg_executor.submit(ffmpeg.mux, segments, audio_cache.path(tts.request_key(tts_request)), target).result()
+
+    save(render, status=RENDER_COMPLETED, progress=100, video_url=f"{RENDER_URL}/{render.id}.mp4")
+
+
+def _download(url, path):
+    response = clip_downloads.get(url, stream=True)
+    try:
+        response.raise_for_status()
+        with open(path, "wb") as f:
+            for block in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                f.write(block)
+    finally:
+        response.close()
+    return path
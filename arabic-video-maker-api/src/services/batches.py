@@ -0,0 +1,141 @@
+import os
+import time
+import uuid
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from src.models.user import db, save
+from src.models.project import Project
+from src.models.job import JOB_COMPLETED
+from src.models.batch import (
+    Batch, BatchItem, BATCH_RUNNING, BATCH_COMPLETED, ITEM_QUEUED, ITEM_SYNTHESIZING,
+    ITEM_GENERATING, ITEM_COMPLETED, ITEM_FAILED, ITEM_TERMINAL_STATES,
+)
+from src.services import jobs
+from src.services import leases
+from src.services import metrics
+from src.services import tts
+from src.services.tts_cache import audio_cache
+
+logger = logging.getLogger(__name__)
+
+# عدد الدفعات التي تعمل في نفس الوقت، والحد الأقصى لتوازي العناصر داخل الدفعة
+BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", "2"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "16"))
+BATCH_DEFAULT_CONCURRENCY = int(os.getenv("BATCH_DEFAULT_CONCURRENCY", "4"))
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "500"))
+
+_app = None
+_executor = None
+_lease = leases.LeaseKeeper(Batch, lambda: Batch.status != BATCH_COMPLETED, lambda batch_id: _lease.submit(_executor, _run_batch, batch_id))
+
+
+def init_app(app):
+    """تهيئة منفذ الدفعات واستئناف الدفعات غير المكتملة"""
+    global _app, _executor
+    _app = app
+    _executor = ThreadPoolExecutor(max_workers=BATCH_WORKERS, thread_name_prefix="batch")
+    with app.app_context():
+        leases.register(app, _lease)
+
+
+def create_batch(scripts, concurrency, generate_video):
+    """إنشاء الدفعة وكل مشاريعها في معاملة واحدة ثم جدولتها"""
+    now = time.time()
+    batch = Batch(
+        id=str(uuid.uuid4()),
+        total=len(scripts),
+        concurrency=min(max(concurrency, 1), BATCH_MAX_CONCURRENCY),
+        generate_video=generate_video,
+        created_at=now,
+    )
+    db.session.add(batch)
+
+    for position, script in enumerate(scripts):
+        project = Project(
+            id=str(uuid.uuid4()),
+            text=script["text"],
+            dialect=script.get("dialect"),
+            voice=script.get("voice"),
+            status="draft",
+            created_at=now,
+        )
+        db.session.add(project)
+        db.session.add(BatchItem(id=str(uuid.uuid4()), batch_id=batch.id, position=position, project_id=project.id, status=ITEM_QUEUED))
+
+    db.session.commit()
+    _lease.submit(_executor, _run_batch, batch.id)
+    return batch
+
+
+def get_batch(batch_id):
+    return db.session.get(Batch, batch_id)
+
+
+def item_counts(batch_id):
+    rows = db.session.query(BatchItem.status, db.func.count()).filter(BatchItem.batch_id == batch_id).group_by(BatchItem.status).all()
+    return {status: count for status, count in rows}
+
+
+def finished_items(batch_id, sent_positions):
+    """العناصر المنتهية التي لم تُرسل بعد للعميل"""
+    items = BatchItem.query.filter(
+        BatchItem.batch_id == batch_id,
+        BatchItem.status.in_(ITEM_TERMINAL_STATES),
+    ).order_by(BatchItem.finished_at).all()
+    return [item for item in items if item.position not in sent_positions]
+
+
+def _run_batch(batch_id):
+    with _app.app_context():
+        batch = db.session.get(Batch, batch_id)
+        if batch is None:
+            return
+        batch.status = BATCH_RUNNING
+        db.session.commit()
+
+        pending = [item.id for item in BatchItem.query.filter(
+            BatchItem.batch_id == batch_id,
+            BatchItem.status.notin_(ITEM_TERMINAL_STATES),
+        ).order_by(BatchItem.position).all()]
+        generate_video = batch.generate_video
+        concurrency = batch.concurrency
+
+    # كل دفعة تحدد توازيها، وتبقى طلبات الخدمات الخارجية محدودة بحدود عملائها المشتركة
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix=f"batch-{batch_id[:8]}") as pool:
+        list(pool.map(lambda item_id: _run_item(item_id, generate_video), pending))
+
+    with _app.app_context():
+        batch = db.session.get(Batch, batch_id)
+        batch.status = BATCH_COMPLETED
+        db.session.commit()
+
+
+def _run_item(item_id, generate_video):
+    metrics.current_route.set("batch_item")
+    with _app.app_context():
+        item = db.session.get(BatchItem, item_id)
+        project = db.session.get(Project, item.project_id)
+        try:
+            if not item.audio_url:
+                save(item, status=ITEM_SYNTHESIZING)
+                tts_request = tts.build_request(project.text, project.voice)
+                item.audio_url = tts.preview(tts_request)
+                meta = audio_cache.metadata(tts.request_key(tts_request)) or {}
+                save(item, duration=meta.get("duration"))
+
+            if generate_video:
+                save(item, status=ITEM_GENERATING)
+                if not item.job_id:
+                    save(item, job_id=jobs.submit_video_job(project.id, project.text, wait=True).id)
+                job = jobs.wait_for_job(item.job_id)
+                if job is None or job.status != JOB_COMPLETED:
+                    raise jobs.JobError(job.error if job is not None else "المهمة غير موجودة")
+                item.video_url = job.video_url
+
+            save(item, status=ITEM_COMPLETED, finished_at=time.time())
+        except Exception as e:
+            logger.warning("batch item %s failed: %s", item_id, e)
+            db.session.rollback()
+            save(item, status=ITEM_FAILED, error=str(e), finished_at=time.time())
+
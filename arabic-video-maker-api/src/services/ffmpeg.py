@@ -0,0 +1,80 @@
+"""أوامر ffmpeg لتجميع الفيديو"""
+import os
+import shutil
+import subprocess
+
+FFMPEG_BIN = os.getenv("FFMPEG_BIN", "ffmpeg")
+VIDEO_WIDTH = int(os.getenv("RENDER_WIDTH", "1280"))
+VIDEO_HEIGHT = int(os.getenv("RENDER_HEIGHT", "720"))
+VIDEO_FPS = int(os.getenv("RENDER_FPS", "24"))
+# خيوط ffmpeg لكل أمر، فعدد الأوامر المتزامنة هو ما يحدد التوازي
+FFMPEG_THREADS = int(os.getenv("FFMPEG_THREADS", "2"))
+
+
+class FfmpegError(Exception):
+    """فشل أمر ffmpeg، والرسالة آخر ما كتبه على stderr"""
+
+
+def available():
+    return shutil.which(FFMPEG_BIN) is not None
+
+
+def fit_segment(source, target, duration):
+    """تكرار المقطع أو قصه ليطابق مدة صوت قطعته، مع توحيد المقاس والإطارات
+
+    إعادة الترميز هنا ضرورية لأن القص الدقيق والتكرار لا يتمان بالنسخ المباشر،
+    وتوحيد المعاملات يسمح بدمج المقاطع لاحقاً دون إعادة ترميز.
+    """
+    video_filter = (
+        f"scale={VIDEO_WIDTH}:{VIDEO_HEIGHT}:force_original_aspect_ratio=decrease,"
+        f"pad={VIDEO_WIDTH}:{VIDEO_HEIGHT}:(ow-iw)/2:(oh-ih)/2,"
+        f"fps={VIDEO_FPS},format=yuv420p"
+    )
+    _run([
+        "-stream_loop", "-1", "-i", source,
+        "-t", f"{duration:.3f}", "-an",
+        "-vf", video_filter,
+        "-c:v", "libx264", "-preset", "veryfast", "-crf", "23",
+        "-threads", str(FFMPEG_THREADS),
+        target,
+    ])
+    return target
+
+
+def mux(segments, audio, target):
+    """دمج المقاطع الموحدة مع صوت السرد بالنسخ المباشر دون إعادة ترميز"""
+    list_path = os.path.join(os.path.dirname(segments[0]), "segments.txt")
+    with open(list_path, "w", encoding="utf-8") as f:
+        for segment in segments:
+            escaped = os.path.abspath(segment).replace("'", r"'\''")
+            f.write(f"file '{escaped}'\n")
+
+    tmp_path = f"{target}.tmp.mp4"
+    try:
+        _run([
+            "-f", "concat", "-safe", "0", "-i", list_path,
+            "-i", audio,
+            "-map", "0:v:0", "-map", "1:a:0",
+            "-c", "copy",
+            "-movflags", "+faststart",
+            tmp_path,
+        ])
+        os.replace(tmp_path, target)
+    finally:
+        for path in (list_path, tmp_path):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+    return target
+
+
+def _run(args):
+    command = [FFMPEG_BIN, "-hide_banner", "-loglevel", "error", "-nostdin", "-y", *args]
+    try:
+        result = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    except FileNotFoundError:
+        raise FfmpegError("ffmpeg غير مثبت على الخادم")
+    if result.returncode != 0:
+        message = result.stderr.decode("utf-8", "replace").strip().splitlines()
+        raise FfmpegError(message[-1] if message else f"ffmpeg exited with {result.returncode}")
@@ -0,0 +1,212 @@
+import os
+import time
+import uuid
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from src.models.user import db, save
+from src.models.project import Project
+from src.models.job import VideoJob, JOB_QUEUED, JOB_RUNNING, JOB_COMPLETED, JOB_FAILED, TERMINAL_STATES
+from src.services import leases
+from src.services import metrics
+from src.services.upstream import stable_diffusion
+
+logger = logging.getLogger(__name__)
+
+STABLE_DIFFUSION_API_KEY = os.getenv("STABLE_DIFFUSION_API_KEY")
+STABLE_DIFFUSION_API_URL = os.getenv("STABLE_DIFFUSION_API_URL", "https://stablediffusionapi.com/api/v5/text2video")
+STABLE_DIFFUSION_FETCH_URL = os.getenv("STABLE_DIFFUSION_FETCH_URL", "https://stablediffusionapi.com/api/v5/fetch")
+
+# عدد العمال وحد الطابور ومهلة المتابعة
+VIDEO_WORKERS = int(os.getenv("VIDEO_WORKERS", "4"))
+VIDEO_QUEUE_MAX = int(os.getenv("VIDEO_QUEUE_MAX", "64"))
+VIDEO_POLL_INTERVAL = float(os.getenv("VIDEO_POLL_INTERVAL", "5"))
+VIDEO_POLL_TIMEOUT = float(os.getenv("VIDEO_POLL_TIMEOUT", "900"))
+
+_app = None
+_executor = None
+_slots = threading.BoundedSemaphore(VIDEO_QUEUE_MAX)
+_futures = {}
+_lease = leases.LeaseKeeper(VideoJob, lambda: VideoJob.status.notin_(TERMINAL_STATES), lambda job_id: _resume(job_id))
+
+
+class QueueFullError(Exception):
+    """الطابور ممتلئ ولا يقبل مهام جديدة"""
+
+
+class JobError(Exception):
+    """خطأ من خدمة Stable Diffusion يُعرض للمستخدم كما هو"""
+
+
+def init_app(app):
+    """تهيئة مجموعة العمال واستئناف المهام غير المكتملة"""
+    global _app, _executor
+    _app = app
+    _executor = ThreadPoolExecutor(max_workers=VIDEO_WORKERS, thread_name_prefix="video-job")
+    with app.app_context():
+        leases.register(app, _lease)
+
+
+def submit_video_job(project_id, prompt, render_id=None, wait=False):
+    """إنشاء مهمة جديدة في الجدول ووضعها في الطابور دون انتظار تنفيذها
+
+    الطابور المشترك قد يمتلئ، فمع wait=True ننتظر مكاناً فيه بدلاً من رفع QueueFullError.
+    """
+    if not _slots.acquire(blocking=wait):
+        raise QueueFullError()
+
+    try:
+        job = VideoJob(id=str(uuid.uuid4()), project_id=project_id, render_id=render_id, prompt=prompt, status=JOB_QUEUED)
+        db.session.add(job)
+        if render_id is None:
+            Project.query.filter_by(id=project_id).update({"status": "processing"})
+        db.session.commit()
+        _enqueue(job.id)
+    except Exception:
+        _slots.release()
+        raise
+    return job
+
+
+def get_job(job_id):
+    return db.session.get(VideoJob, job_id)
+
+
+def pending_count():
+    """عدد المهام المنتظرة أو العاملة في هذه العملية"""
+    return len(_futures)
+
+
+def wait_for_job(job_id):
+    """انتظار انتهاء المهمة وإرجاعها، ولو كانت تعمل في عامل آخر"""
+    future = _futures.get(job_id)
+    if future is not None:
+        future.result()
+
+    while True:
+        # إنهاء المعاملة الحالية حتى نقرأ آخر حالة كتبها العامل
+        db.session.commit()
+        job = db.session.get(VideoJob, job_id)
+        if job is None or job.is_done:
+            return job
+        time.sleep(VIDEO_POLL_INTERVAL)
+
+
+def _resume(job_id):
+    # المهمة حُجزت لأن عاملها توقف؛ إن كان الطابور ممتلئاً يُعاد حجزها بعد انتهاء المهلة
+    if _slots.acquire(blocking=False):
+        _enqueue(job_id)
+
+
+def _enqueue(job_id):
+    # الحجز يتجدد ما دامت المهمة في طابور هذه العملية فلا يستأنفها عامل آخر
+    future = _lease.submit(_executor, _run_job, job_id)
+    _futures[job_id] = future
+    future.add_done_callback(lambda _: _futures.pop(job_id, None))
+
+
+def _run_job(job_id):
+    metrics.current_route.set("video_job")
+    try:
+        with _app.app_context():
+            job = db.session.get(VideoJob, job_id)
+            if job is None or job.is_done:
+                return
+            try:
+                _execute(job)
+            except JobError as e:
+                save(job, status=JOB_FAILED, error=str(e))
+            except requests.exceptions.Timeout:
+                save(job, status=JOB_FAILED, error="انتهت مهلة الاتصال مع خدمة إنشاء الفيديو")
+            except requests.exceptions.RequestException as e:
+                save(job, status=JOB_FAILED, error=f"خطأ في الاتصال: {str(e)}")
+            except Exception as e:
+                logger.exception("video job %s crashed", job_id)
+                save(job, status=JOB_FAILED, error=f"حدث خطأ غير متوقع: {str(e)}")
+
+            # نقل النتيجة إلى المشروع حتى تظهر في قائمة المشاريع، إلا مقاطع التصيير فينقلها التصيير عند اكتماله
+            if job.render_id is None:
+                Project.query.filter_by(id=job.project_id).update({"status": job.status, "video_url": job.video_url})
+                db.session.commit()
+    finally:
+        _slots.release()
+
+
+def _execute(job):
+    if not job.upstream_id:
+        save(job, status=JOB_RUNNING, progress=10)
+        if _handle_result(job, _start_generation(job.prompt)):
+            return
+    else:
+        save(job, status=JOB_RUNNING)
+
+    # متابعة المهمة لدى Stable Diffusion حتى تكتمل أو تنتهي المهلة
+    started = time.time()
+    delay = VIDEO_POLL_INTERVAL
+    while time.time() - started < VIDEO_POLL_TIMEOUT:
+        time.sleep(delay)
+        elapsed = time.time() - started
+        save(job, progress=min(90, 30 + int(60 * elapsed / VIDEO_POLL_TIMEOUT)))
+        data = _fetch_result(job)
+        if _handle_result(job, data):
+            return
+        eta = data.get("eta")
+        delay = min(max(float(eta), 1.0), 15.0) if isinstance(eta, (int, float)) else VIDEO_POLL_INTERVAL
+
+    raise JobError("انتهت مهلة انتظار الفيديو من الخدمة")
+
+
+def _start_generation(prompt):
+    headers = {"Content-Type": "application/json"}
+    payload = {
+        "key": STABLE_DIFFUSION_API_KEY,
+        "prompt": f"high quality video of {prompt}, cinematic, professional",
+        "negative_prompt": "low quality, bad anatomy, blurry, deformed, disfigured, watermark, text",
+        "scheduler": "UniPCMultistepScheduler",
+        "seconds": 3,  # تقليل المدة لتوفير الوقت والتكلفة
+        "guidance_scale": 7.5,
+        "num_inference_steps": 20
+    }
+    response = stable_diffusion.post(STABLE_DIFFUSION_API_URL, headers=headers, json=payload)
+    return _parse_response(response)
+
+
+def _fetch_result(job):
+    url = job.fetch_url or f"{STABLE_DIFFUSION_FETCH_URL}/{job.upstream_id}"
+    headers = {"Content-Type": "application/json"}
+    # الاستعلام عن النتيجة لا ينشئ شيئاً فإعادته آمنة رغم أنه POST
+    response = stable_diffusion.post(url, headers=headers, json={"key": STABLE_DIFFUSION_API_KEY}, idempotent=True)
+    return _parse_response(response)
+
+
+def _parse_response(response):
+    if response.status_code == 401:
+        raise JobError("مفتاح API غير صحيح أو منتهي الصلاحية")
+    elif response.status_code == 402:
+        raise JobError("رصيد API غير كافي")
+    elif response.status_code == 429:
+        raise JobError("تم تجاوز حد الطلبات. يرجى المحاولة لاحقاً")
+
+    response.raise_for_status()
+    return response.json()
+
+
+def _handle_result(job, data):
+    """تحديث المهمة حسب رد الخدمة، وإرجاع True إذا انتهت"""
+    status = data.get("status")
+    if status == "success" and data.get("output"):
+        save(job, status=JOB_COMPLETED, progress=100, video_url=data["output"][0])
+        return True
+    elif status == "processing":
+        if not job.upstream_id:
+            if not data.get("id"):
+                raise JobError("لم تُرجع الخدمة معرف المهمة للمتابعة")
+            save(job, progress=30, upstream_id=str(data["id"]), fetch_url=data.get("fetch_result"))
+        return False
+    else:
+        error_msg = data.get("message", data.get("messege", "فشل في إنشاء الفيديو"))
+        raise JobError(f"خطأ من API: {error_msg}")
+
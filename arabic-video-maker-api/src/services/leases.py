@@ -0,0 +1,111 @@
+"""حجز المهام الطويلة بين عمال gunicorn عبر عمود updated_at
+
+كل عملية تجدد updated_at للصفوف التي تعمل عليها أو تنتظر في طابورها كل HEARTBEAT_INTERVAL،
+والصف غير المنتهي الذي لم يُجدد منذ LEASE_SECONDS يعني أن العامل الذي حجزه توقف،
+فيحجزه بتحديث ذري أول عامل يلاحظ ذلك ويستأنفه.
+"""
+import os
+import time
+import logging
+import threading
+
+from src.models.user import db
+
+logger = logging.getLogger(__name__)
+
+LEASE_SECONDS = float(os.getenv("WORKER_LEASE_SECONDS", "60"))
+HEARTBEAT_INTERVAL = LEASE_SECONDS / 4
+
+_app = None
+_keepers = []
+_thread = None
+_lock = threading.Lock()
+
+
+class LeaseKeeper:
+    def __init__(self, model, pending, resume):
+        self.model = model
+        # دالة ترجع شرط الصفوف غير المنتهية
+        self.pending = pending
+        self.resume = resume
+        self._lock = threading.Lock()
+        self._held = set()
+
+    def hold(self, row_id):
+        with self._lock:
+            self._held.add(row_id)
+
+    def release(self, row_id):
+        with self._lock:
+            self._held.discard(row_id)
+
+    def holds(self, row_id):
+        with self._lock:
+            return row_id in self._held
+
+    def heartbeat(self):
+        with self._lock:
+            held = list(self._held)
+        if held:
+            self.model.query.filter(self.model.id.in_(held)).update({"updated_at": time.time()}, synchronize_session=False)
+            db.session.commit()
+
+    def claim_stale(self):
+        """حجز الصفوف المتروكة وإرجاع معرفاتها؛ الصف لا يحجزه إلا عامل واحد"""
+        now = time.time()
+        rows = db.session.query(self.model.id, self.model.updated_at).filter(
+            self.pending(),
+            self.model.updated_at < now - LEASE_SECONDS,
+        ).all()
+        claimed = []
+        for row_id, updated_at in rows:
+            if self.holds(row_id):
+                continue
+            count = self.model.query.filter_by(id=row_id, updated_at=updated_at).update({"updated_at": now}, synchronize_session=False)
+            db.session.commit()
+            if count:
+                claimed.append(row_id)
+        return claimed
+
+    def submit(self, executor, fn, row_id):
+        """تشغيل fn(row_id) في المنفذ مع تجديد حجز الصف حتى تنتهي"""
+        self.hold(row_id)
+        future = executor.submit(fn, row_id)
+        future.add_done_callback(lambda _: self.release(row_id))
+        return future
+
+    def resume_stale(self):
+        for row_id in self.claim_stale():
+            logger.info("resuming stale %s %s", self.model.__tablename__, row_id)
+            self.resume(row_id)
+
+
+def register(app, keeper):
+    """استئناف الصفوف المتروكة الآن، ثم تجديد الحجز وفحص الصفوف المتروكة دورياً"""
+    global _app, _thread
+    _app = app
+    with _lock:
+        _keepers.append(keeper)
+        if _thread is None:
+            _thread = threading.Thread(target=_loop, name="leases", daemon=True)
+            _thread.start()
+    keeper.resume_stale()
+    return keeper
+
+
+def _loop():
+    last_scan = time.monotonic()
+    while True:
+        time.sleep(HEARTBEAT_INTERVAL)
+        scan = time.monotonic() - last_scan >= LEASE_SECONDS
+        if scan:
+            last_scan = time.monotonic()
+        with _app.app_context():
+            for keeper in list(_keepers):
+                try:
+                    keeper.heartbeat()
+                    if scan:
+                        keeper.resume_stale()
+                except Exception:
+                    logger.exception("lease maintenance failed for %s", keeper.model.__tablename__)
+                    db.session.rollback()
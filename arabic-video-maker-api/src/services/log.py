@@ -0,0 +1,53 @@
+import os
+import sys
+import json
+import queue
+import atexit
+import logging
+from logging.handlers import QueueHandler, QueueListener
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    """سطر JSON واحد لكل سجل مع الحقول الإضافية الممررة في extra={"fields": ...}"""
+
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        entry.update(getattr(record, "fields", None) or {})
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _DeferredQueueHandler(QueueHandler):
+    """تمرير السجل كما هو ليُنسق في خيط الكتابة لا في خيط الطلب"""
+
+    def prepare(self, record):
+        return record
+
+
+def configure_logging():
+    """السجلات تُوضع في طابور ويكتبها خيط منفصل فلا ينتظر أي طلب الكتابة على القرص أو الطرفية"""
+    global _listener
+    if _listener is not None:
+        return
+
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(JsonFormatter())
+    records = queue.SimpleQueue()
+    _listener = QueueListener(records, handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+    root = logging.getLogger()
+    root.handlers = [_DeferredQueueHandler(records)]
+    root.setLevel(LOG_LEVEL)
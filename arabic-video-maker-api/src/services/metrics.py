@@ -0,0 +1,328 @@
+"""مقاييس زمنية بصيغة Prometheus النصية دون اعتماديات خارجية
+
+كل عملية (عامل gunicorn) تحتفظ بمقاييسها في الذاكرة. إذا ضُبط METRICS_DIR تكتب كل عملية لقطة
+من مقاييسها فيه دورياً، ويجمع /api/metrics لقطات كل العمال فلا يرى Prometheus تصفيراً عند تبدل العامل.
+يجب إفراغ المجلد قبل تشغيل الخادم كما في وضع multiprocess في prometheus_client.
+"""
+import os
+import json
+import time
+import atexit
+import bisect
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+
+from flask import Request, g, request
+from flask.json.provider import DefaultJSONProvider
+
+access_logger = logging.getLogger("access")
+
+# حدود الفترات بالثواني: من أجزاء الملّي ثانية (تحليل JSON) إلى دقيقة (خدمات التوليد)
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# المسار الحالي لتسمية المقاييس التي تُسجل بعيداً عن كود المسار نفسه
+current_route = contextvars.ContextVar("current_route", default="background")
+
+METRICS_DIR = os.getenv("METRICS_DIR") or None
+METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", "1"))
+
+
+class Histogram:
+    # فترات العمال المتوقفين تبقى في المجموع حتى لا تتناقص العدادات
+    include_dead = True
+
+    def __init__(self, name, documentation, labelnames, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        # labels -> [عدادات الفترات، المجموع، العدد]
+        self._series = {}
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return [[list(key), list(counts), total, count] for key, (counts, total, count) in self._series.items()]
+
+    def render(self, snapshots=None):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        merged = {}
+        for snapshot in snapshots if snapshots is not None else [self.snapshot()]:
+            for key, counts, total, count in snapshot:
+                series = merged.setdefault(tuple(key), [[0] * len(self.buckets), 0.0, 0])
+                series[0] = [a + b for a, b in zip(series[0], counts)]
+                series[1] += total
+                series[2] += count
+        series = [(key, counts, total, count) for key, (counts, total, count) in merged.items()]
+        for key, counts, total, count in sorted(series):
+            labels = list(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_labels(labels + [('le', _number(bound))])} {cumulative}")
+            lines.append(f"{self.name}_bucket{_labels(labels + [('le', '+Inf')])} {count}")
+            lines.append(f"{self.name}_sum{_labels(labels)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(labels)} {count}")
+        return lines
+
+
+class Gauge:
+    type = "gauge"
+    # القيم اللحظية للعمال المتوقفين لا معنى لها
+    include_dead = False
+
+    def __init__(self, name, documentation, labelnames=(), aggregate=sum):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        # دالة جمع قيم العمال لنفس التسميات
+        self.aggregate = aggregate
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = value
+
+    def snapshot(self):
+        with self._lock:
+            return [[list(key), value] for key, value in self._values.items()]
+
+    def render(self, snapshots=None):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        merged = {}
+        for snapshot in snapshots if snapshots is not None else [self.snapshot()]:
+            for key, value in snapshot:
+                merged.setdefault(tuple(key), []).append(value)
+        values = sorted((key, self.aggregate(worker_values)) for key, worker_values in merged.items())
+        for key, value in values:
+            lines.append(f"{self.name}{_labels(list(zip(self.labelnames, key)))} {_number(value)}")
+        return lines
+
+
+
+class Counter(Gauge):
+    """عداد تراكمي: set() تنسخ إليه مجموعاً يحتفظ به كائن آخر مثل إحصائيات ذاكرة الصوت
+
+    مجاميع العمال المتوقفين تبقى في المجموع فلا يتناقص العداد ويمكن استخدام rate() عليه.
+    """
+    type = "counter"
+    include_dead = True
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames, aggregate=sum)
+
+stage_seconds = Histogram(
+    "app_stage_duration_seconds",
+    "Duration of each pipeline stage (request_parse, upstream_connect, upstream_first_byte, upstream_total, disk_write, json_serialization).",
+    ("route", "provider", "stage"),
+)
+request_seconds = Histogram(
+    "http_request_duration_seconds",
+    "Time to produce the HTTP response, by route, method and status.",
+    ("route", "method", "status"),
+)
+requests_in_flight = Gauge("http_requests_in_flight", "Requests currently being handled.")
+
+_registry = [stage_seconds, request_seconds, requests_in_flight]
+# دوال تُستدعى عند العرض لتحديث مقاييس لحظية مثل إحصائيات الذاكرة
+_collectors = []
+# العملية التي بدأ فيها خيط كتابة اللقطات؛ العامل المنسوخ بـ fork يبدأ خيطه بنفسه
+_flusher_pid = None
+_flusher_lock = threading.Lock()
+
+
+def register(metric):
+    _registry.append(metric)
+    return metric
+
+
+def register_collector(collector):
+    _collectors.append(collector)
+    return collector
+
+
+def observe_stage(stage, seconds, provider="", route=None):
+    stage_seconds.observe(seconds, route=route or current_route.get(), provider=provider, stage=stage)
+
+
+@contextmanager
+def timed_stage(stage, provider=""):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - started, provider)
+
+
+def propagate(fn):
+    """تشغيل الدالة في خيط آخر مع نفس المسار الحالي لتسمية مقاييسها"""
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        return context.copy().run(fn, *args, **kwargs)
+
+    return run
+
+
+class TimedRequest(Request):
+    def get_json(self, *args, **kwargs):
+        with timed_stage("request_parse"):
+            return super().get_json(*args, **kwargs)
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+    def dumps(self, obj, **kwargs):
+        with timed_stage("json_serialization"):
+            return super().dumps(obj, **kwargs)
+
+
+def init_app(app):
+    """قياس زمن كل طلب ومراحله وتسجيل سطر وصول منظم له"""
+    app.request_class = TimedRequest
+    app.json = TimedJSONProvider(app)
+
+    @app.before_request
+    def start_timer():
+        if METRICS_DIR is not None and _flusher_pid != os.getpid():
+            _start_flusher()
+        g.metrics_started = time.perf_counter()
+        current_route.set(request.url_rule.rule if request.url_rule is not None else "unmatched")
+        requests_in_flight.inc()
+        g.metrics_in_flight = True
+
+    @app.after_request
+    def record_request(response):
+        # للردود المبثوثة يُقاس الزمن حتى بدء الإرسال فقط
+        started = g.pop("metrics_started", None)
+        if started is not None:
+            seconds = time.perf_counter() - started
+            route = current_route.get()
+            request_seconds.observe(seconds, route=route, method=request.method, status=response.status_code)
+            access_logger.info("request", extra={"fields": {
+                "method": request.method,
+                "path": request.path,
+                "route": route,
+                "status": response.status_code,
+                "duration_ms": round(seconds * 1000, 2),
+                "bytes": response.content_length,
+            }})
+        return response
+
+    @app.teardown_request
+    def finish_request(exc):
+        if g.pop("metrics_in_flight", False):
+            requests_in_flight.dec()
+
+
+def render():
+    for collector in _collectors:
+        collector()
+    snapshots = None
+    if METRICS_DIR is not None:
+        # مقاييس هذه العملية من الذاكرة، ولقطات العمال الآخرين عمرها حتى METRICS_FLUSH_INTERVAL
+        snapshots = _read_snapshots(exclude=os.getpid()) + [(True, _snapshot())]
+    lines = []
+    for metric in _registry:
+        if snapshots is None:
+            lines.extend(metric.render())
+        else:
+            lines.extend(metric.render([data.get(metric.name, []) for alive, data in snapshots if alive or metric.include_dead]))
+    return "\n".join(lines) + "\n"
+
+
+def _start_flusher():
+    global _flusher_pid
+    with _flusher_lock:
+        if _flusher_pid == os.getpid():
+            return
+        _flusher_pid = os.getpid()
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    threading.Thread(target=_flush_loop, name="metrics", daemon=True).start()
+    atexit.register(_flush)
+
+
+def _flush_loop():
+    while True:
+        time.sleep(METRICS_FLUSH_INTERVAL)
+        try:
+            _flush()
+        except Exception:
+            logging.getLogger(__name__).exception("metrics flush failed")
+
+
+def _flush():
+    """كتابة لقطة مقاييس هذه العملية بتبديل ذري للملف"""
+    for collector in _collectors:
+        collector()
+    data = _snapshot()
+    path = os.path.join(METRICS_DIR, f"{os.getpid()}.json")
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def _snapshot():
+    return {metric.name: metric.snapshot() for metric in _registry}
+
+
+def _read_snapshots(exclude=None):
+    snapshots = []
+    for name in os.listdir(METRICS_DIR):
+        pid, _, extension = name.partition(".")
+        if extension != "json" or not pid.isdigit() or int(pid) == exclude:
+            continue
+        try:
+            with open(os.path.join(METRICS_DIR, name), encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            continue
+        snapshots.append((_alive(int(pid)), data))
+    return snapshots
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _labels(pairs):
+    if not pairs:
+        return ""
+    escaped = (f'{name}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"' for name, value in pairs)
+    return "{" + ",".join(escaped) + "}"
+
+
+def _number(value):
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
@@ -0,0 +1,185 @@
+"""قراءة مدة ملفات MP3 ومعدل البت من ترويسات الإطارات دون فك الترميز"""
+
+# معدلات البت بالكيلوبت لكل (إصدار MPEG، الطبقة)، والفهرس 0 يعني "حر" و15 غير صالح
+_BITRATES = {
+    (1, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (1, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (1, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (2, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (2, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (2, 3): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+
+# معدلات العينات حسب بتات الإصدار في الترويسة: 3 = MPEG1، 2 = MPEG2، 0 = MPEG2.5
+_SAMPLE_RATES = {
+    3: (44100, 48000, 32000),
+    2: (22050, 24000, 16000),
+    0: (11025, 12000, 8000),
+}
+
+# أقصى ما نحتاجه من الإطار الأول لفحص وسم Xing/Info/VBRI
+_FIRST_FRAME_PEEK = 40
+
+
+def parse_header(header):
+    """تحليل ترويسة إطار من 4 بايتات، وإرجاع (الطول، العينات، معدل العينات، القنوات، إزاحة Xing) أو None"""
+    if header[0] != 0xFF or (header[1] & 0xE0) != 0xE0:
+        return None
+
+    version_bits = (header[1] >> 3) & 0x03
+    layer_bits = (header[1] >> 1) & 0x03
+    bitrate_index = (header[2] >> 4) & 0x0F
+    sample_rate_index = (header[2] >> 2) & 0x03
+    padding = (header[2] >> 1) & 0x01
+    channel_mode = (header[3] >> 6) & 0x03
+
+    if version_bits == 1 or layer_bits == 0 or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None
+
+    version = 1 if version_bits == 3 else 2
+    layer = 4 - layer_bits
+    bitrate = _BITRATES[(version, layer)][bitrate_index] * 1000
+    sample_rate = _SAMPLE_RATES[version_bits][sample_rate_index]
+    channels = 1 if channel_mode == 3 else 2
+
+    if layer == 1:
+        samples = 384
+        length = (12 * bitrate // sample_rate + padding) * 4
+    elif layer == 2 or version == 1:
+        samples = 1152
+        length = 144 * bitrate // sample_rate + padding
+    else:
+        samples = 576
+        length = 72 * bitrate // sample_rate + padding
+
+    # وسم Xing/Info يأتي بعد المعلومات الجانبية لطبقة III
+    if version == 1:
+        side_info = 17 if channels == 1 else 32
+    else:
+        side_info = 9 if channels == 1 else 17
+    return length, samples, sample_rate, channels, 4 + side_info
+
+
+def id3v2_size(data):
+    """طول وسم ID3v2 في بداية الملف (0 إن لم يوجد)"""
+    if len(data) < 10 or data[:3] != b"ID3":
+        return 0
+    size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+    footer = 10 if data[5] & 0x10 else 0
+    return 10 + size + footer
+
+
+def _is_info_frame(frame, xing_offset):
+    return frame[xing_offset:xing_offset + 4] in (b"Xing", b"Info") or frame[36:40] == b"VBRI"
+
+
+class Mp3Probe:
+    """قراءة الإطارات على دفعات أثناء البث في مرور واحد
+
+    لا يُحتفظ في الذاكرة إلا بما يكفي لقراءة ترويسة الإطار التالي، وتُتخطى بيانات الصوت نفسها.
+    """
+
+    def __init__(self):
+        self.frames = 0
+        self.samples = 0
+        self.audio_bytes = 0
+        self.sample_rate = None
+        self.channels = None
+        self._buffer = bytearray()
+        self._skip = 0
+        self._started = False
+        self._first_frame = True
+
+    def feed(self, chunk):
+        if self._skip:
+            skipped = min(self._skip, len(chunk))
+            self._skip -= skipped
+            chunk = memoryview(chunk)[skipped:]
+        self._buffer += chunk
+        self._parse()
+
+    def result(self):
+        duration = self.samples / self.sample_rate if self.sample_rate else 0.0
+        bitrate = round(self.audio_bytes * 8 / duration / 1000) if duration else 0
+        return {
+            "duration": round(duration, 3),
+            "bitrate": bitrate,
+            "sample_rate": self.sample_rate,
+            "channels": self.channels,
+            "frames": self.frames,
+        }
+
+    def _parse(self):
+        buffer = self._buffer
+        pos = 0
+        while not self._skip:
+            available = len(buffer) - pos
+            if not self._started:
+                if available < 10:
+                    break
+                self._started = True
+                pos = self._advance(pos, id3v2_size(buffer[pos:pos + 10]))
+                continue
+
+            if available < 4:
+                break
+            header = parse_header(buffer[pos:pos + 4])
+            if header is None:
+                # ليست بداية إطار: نبحث عن المزامنة التالية
+                pos += 1
+                continue
+
+            length, samples, sample_rate, channels, xing_offset = header
+            if self._first_frame:
+                if available < _FIRST_FRAME_PEEK:
+                    break
+                self._first_frame = False
+                if _is_info_frame(buffer[pos:pos + _FIRST_FRAME_PEEK], xing_offset):
+                    pos = self._advance(pos, length)
+                    continue
+
+            self.frames += 1
+            self.samples += samples
+            self.audio_bytes += length
+            self.sample_rate = sample_rate
+            self.channels = channels
+            pos = self._advance(pos, length)
+
+        del buffer[:pos]
+
+    def _advance(self, pos, length):
+        end = pos + length
+        if end > len(self._buffer):
+            self._skip = end - len(self._buffer)
+            return len(self._buffer)
+        return end
+
+
+def probe(data):
+    """قراءة بيانات ملف كامل"""
+    mp3_probe = Mp3Probe()
+    mp3_probe.feed(data)
+    return mp3_probe.result()
+
+
+def probe_file(path, block_size=64 * 1024):
+    mp3_probe = Mp3Probe()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            mp3_probe.feed(block)
+    return mp3_probe.result()
+
+
+def audio_frames(data):
+    """إرجاع إطارات الصوت فقط دون وسوم ID3 وإطار Xing/Info، لدمج الملفات دون فجوات"""
+    pos = id3v2_size(data)
+    end = len(data)
+    start = pos
+    header = parse_header(data[pos:pos + 4]) if end - pos >= 4 else None
+    if header is not None and _is_info_frame(data[pos:pos + _FIRST_FRAME_PEEK], header[4]):
+        start = pos + header[0]
+
+    # وسم ID3v1 في النهاية
+    if end - start >= 128 and data[end - 128:end - 125] == b"TAG":
+        end -= 128
+    return data[start:end]
@@ -0,0 +1,122 @@
+import os
+import gzip
+import hashlib
+import mimetypes
+
+from flask import Response, send_from_directory
+
+try:
+    import brotli
+except ImportError:  # brotli اختياري، ونكتفي بـ gzip إن لم يكن مثبتاً
+    brotli = None
+
+# الملفات التي تستفيد من الضغط، وأصغر حجم يستحق ضغطه
+COMPRESSIBLE_EXTENSIONS = {".js", ".css", ".html", ".svg", ".json", ".map", ".txt", ".ico"}
+MIN_COMPRESS_SIZE = 1024
+# الملفات الأكبر من هذا تُرسل من القرص بدل الذاكرة
+MAX_MEMORY_FILE = int(os.getenv("STATIC_MAX_MEMORY_FILE", str(4 * 1024 * 1024)))
+
+# ملفات Vite في assets/ وملفات الصوت في tts/ أسماؤها بصمة محتواها، والفيديو النهائي باسم تصيير فريد، فلا تتغير أبداً
+IMMUTABLE_PREFIXES = ("assets/", "tts/", "renders/")
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+DEFAULT_CACHE = "public, max-age=3600"
+# مجلدات تتغير أثناء التشغيل فلا تدخل في الفهرس
+DYNAMIC_DIRS = ("tts", "renders")
+
+
+class StaticFile:
+    def __init__(self, path, abs_path, data, size, etag, mimetype):
+        self.path = path
+        self.abs_path = abs_path
+        self.data = data
+        self.size = size
+        self.etag = etag
+        self.mimetype = mimetype
+        # encoding -> البيانات المضغوطة
+        self.variants = {}
+
+
+class StaticIndex:
+    """فهرس في الذاكرة لملفات static يُبنى مرة عند التشغيل، فلا نلمس القرص لكل طلب"""
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        self.files = {}
+        self.build()
+
+    def build(self):
+        files = {}
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            if dirpath == self.root:
+                dirnames[:] = [d for d in dirnames if d not in DYNAMIC_DIRS]
+            for name in filenames:
+                abs_path = os.path.join(dirpath, name)
+                path = os.path.relpath(abs_path, self.root).replace(os.sep, "/")
+                files[path] = self._load(path, abs_path)
+        self.files = files
+
+    def get(self, path):
+        return self.files.get(path)
+
+    def _load(self, path, abs_path):
+        size = os.path.getsize(abs_path)
+        mimetype = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        digest = hashlib.md5()
+        data = None
+        with open(abs_path, "rb") as f:
+            if size <= MAX_MEMORY_FILE:
+                data = f.read()
+                digest.update(data)
+            else:
+                for block in iter(lambda: f.read(64 * 1024), b""):
+                    digest.update(block)
+
+        entry = StaticFile(path, abs_path, data, size, digest.hexdigest(), mimetype)
+        if data is not None and size >= MIN_COMPRESS_SIZE and os.path.splitext(path)[1] in COMPRESSIBLE_EXTENSIONS:
+            candidates = {"gzip": gzip.compress(data, compresslevel=9, mtime=0)}
+            if brotli is not None:
+                candidates["br"] = brotli.compress(data, quality=11)
+            entry.variants = {enc: body for enc, body in candidates.items() if len(body) < size}
+        return entry
+
+
+def cache_control(path):
+    if path.startswith(IMMUTABLE_PREFIXES):
+        return IMMUTABLE_CACHE
+    if path.endswith(".html"):
+        # index.html يشير إلى أسماء الملفات الجديدة بعد كل بناء فيجب التحقق منه دائماً
+        return "no-cache"
+    return DEFAULT_CACHE
+
+
+def serve_entry(entry, request):
+    """إرسال الملف مع اختيار الضغط حسب Accept-Encoding ودعم ETag و304 وRange"""
+    if entry.data is None:
+        response = send_from_directory(os.path.dirname(entry.abs_path), os.path.basename(entry.abs_path), conditional=True, etag=entry.etag)
+        response.headers["Cache-Control"] = cache_control(entry.path)
+        return response
+
+    encoding = None
+    for candidate in ("br", "gzip"):
+        if candidate in entry.variants and request.accept_encodings[candidate]:
+            encoding = candidate
+            break
+
+    body = entry.variants[encoding] if encoding else entry.data
+    response = Response(body, mimetype=entry.mimetype)
+    response.set_etag(f"{entry.etag}-{encoding}" if encoding else entry.etag)
+    response.headers["Cache-Control"] = cache_control(entry.path)
+    if entry.variants:
+        response.vary.add("Accept-Encoding")
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+
+    # النطاقات تُدعم على الملف الأصلي فقط (مثل ملفات mp3) وليس على النسخ المضغوطة
+    return response.make_conditional(request, accept_ranges=encoding is None, complete_length=len(body))
+
+
+def serve_dynamic(root, path, url_path=None):
+    """ملفات تُنشأ أثناء التشغيل مثل ذاكرة الصوت تُرسل من القرص مع دعم Range"""
+    response = send_from_directory(root, path, conditional=True)
+    response.headers["Cache-Control"] = cache_control(url_path or path)
+    return response
@@ -0,0 +1,76 @@
+import os
+import re
+import unicodedata
+
+TTS_CHUNK_MAX_CHARS = int(os.getenv("TTS_CHUNK_MAX_CHARS", "400"))
+
+# نهايات الجمل: النقطة وعلامات الاستفهام والتعجب (ومنها علامة الاستفهام العربية ؟) والنقطة الأردية
+SENTENCE_END = ".!?؟۔…"
+# فواصل العبارات: الفاصلة العربية ، والفاصلة المنقوطة العربية ؛ ونظائرها اللاتينية
+CLAUSE_END = ",;:،؛"
+
+# الفصل بعد علامة النهاية إذا تبعتها مسافة فقط، حتى لا نقسم أرقاماً مثل 3.5 أو اختصارات ملتصقة
+_SENTENCE_SPLIT = re.compile(
+    rf"(?<=[{re.escape(SENTENCE_END)}])\s+"
+    rf"|(?<=[{re.escape(SENTENCE_END)}][\"'»”)\]])\s+"
+    r"|\n\s*"
+)
+_CLAUSE_SPLIT = re.compile(rf"(?<=[{re.escape(CLAUSE_END)}])\s+")
+
+
+def is_diacritic(char):
+    """الحركات والتنوين والشدة والسكون والألف الخنجرية لا تُفصل عن الحرف الذي قبلها"""
+    return unicodedata.combining(char) != 0 or "\u064b" <= char <= "\u065f" or char == "\u0670"
+
+
+def split_text(text, max_chars=TTS_CHUNK_MAX_CHARS):
+    """تقسيم النص إلى جمل، وتقسيم الجمل الطويلة إلى عبارات ثم كلمات
+
+    كل جملة قطعة مستقلة حتى يبقى مفتاح كل جملة ثابتاً عند تعديل جملة أخرى.
+    """
+    chunks = []
+    for sentence in _SENTENCE_SPLIT.split(text):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        if len(sentence) <= max_chars:
+            chunks.append(sentence)
+            continue
+        for clause in _pack(_CLAUSE_SPLIT.split(sentence), max_chars):
+            if len(clause) <= max_chars:
+                chunks.append(clause)
+            else:
+                chunks.extend(_pack(_split_words(clause, max_chars), max_chars))
+    return chunks
+
+
+def _split_words(text, max_chars):
+    words = []
+    for word in text.split():
+        while len(word) > max_chars:
+            cut = max_chars
+            # لا نقطع بين الحرف وحركاته
+            while cut > 1 and is_diacritic(word[cut]):
+                cut -= 1
+            words.append(word[:cut])
+            word = word[cut:]
+        words.append(word)
+    return words
+
+
+def _pack(pieces, max_chars):
+    """ضم القطع المتتالية ما دام طولها لا يتجاوز الحد"""
+    packed = []
+    current = ""
+    for piece in pieces:
+        piece = piece.strip()
+        if not piece:
+            continue
+        if current and len(current) + 1 + len(piece) > max_chars:
+            packed.append(current)
+            current = piece
+        else:
+            current = f"{current} {piece}" if current else piece
+    if current:
+        packed.append(current)
+    return packed
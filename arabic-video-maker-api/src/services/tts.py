@@ -0,0 +1,175 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from src.services import mp3
+from src.services import metrics
+from src.services.upstream import elevenlabs
+from src.services.text_chunker import split_text
+from src.services.tts_cache import audio_cache, cache_key, combined_key
+
+ELEVENLABS_API_KEY = os.getenv("ELEVENLABS_API_KEY")
+ELEVENLABS_API_URL = os.getenv("ELEVENLABS_API_URL", "https://api.elevenlabs.io/v1/text-to-speech")
+
+DEFAULT_MODEL_ID = "eleven_multilingual_v2"
+DEFAULT_VOICE_SETTINGS = {"stability": 0.5, "similarity_boost": 0.75}
+STREAM_CHUNK_SIZE = 4096
+TTS_CHUNK_WORKERS = int(os.getenv("TTS_CHUNK_WORKERS", "4"))
+
+# توليد قطع النص الطويل بالتوازي بعدد محدود من الطلبات
+_chunk_executor = ThreadPoolExecutor(max_workers=TTS_CHUNK_WORKERS, thread_name_prefix="tts-chunk")
+
+
+def resolve_voice(voice_id):
+    # ElevenLabs voice mapping (example, you'll need to map your UI voices to ElevenLabs voice_ids)
+    # For now, I'll use a placeholder voice_id. You'll need to get actual voice_ids from ElevenLabs.
+    # This is a crucial step for proper integration.
+    # Example: if voice_id == 'male1': elevenlabs_voice_id = 'YOUR_MALE1_VOICE_ID'
+    # For demonstration, I'll use a generic voice ID if not found.
+    elevenlabs_voice_id = "21m00Tzpb8JJc4PzHMd8" # A generic male voice from ElevenLabs for testing
+    if voice_id == 'female1':
+        elevenlabs_voice_id = "EXAVITQu4vr4xnSDxMaL" # A generic female voice from ElevenLabs for testing
+    return elevenlabs_voice_id
+
+
+def build_request(text, voice_id):
+    """تجهيز طلب ElevenLabs بالقيم الافتراضية"""
+    return {
+        "text": text,
+        "voice_id": resolve_voice(voice_id),
+        "model_id": DEFAULT_MODEL_ID,
+        "voice_settings": DEFAULT_VOICE_SETTINGS,
+    }
+
+
+def split_request(tts_request):
+    """تقسيم الطلب إلى طلب لكل جملة بنفس الصوت والإعدادات"""
+    chunks = split_text(tts_request["text"])
+    if len(chunks) <= 1:
+        return [tts_request]
+    return [dict(tts_request, text=chunk) for chunk in chunks]
+
+
+def request_key(tts_request):
+    """مفتاح الملف النهائي: مفتاح القطعة نفسها، أو مفتاح مركب من مفاتيح القطع"""
+    chunks = split_request(tts_request)
+    if len(chunks) == 1:
+        return _chunk_key(chunks[0])
+    return combined_key([_chunk_key(chunk) for chunk in chunks])
+
+
+def synthesize(tts_request):
+    """توليد الصوت كاملاً وإرجاع البايتات"""
+    # نفس النص يعطي نفس الصوت ولا ينشئ شيئاً لدى الخدمة فإعادته آمنة
+    response = elevenlabs.post(
+        f"{ELEVENLABS_API_URL}/{tts_request['voice_id']}",
+        headers=_headers(),
+        json=_payload(tts_request),
+        idempotent=True,
+    )
+    response.raise_for_status()  # Raise an exception for HTTP errors
+    return response.content
+
+
+def open_stream(tts_request):
+    """فتح اتصال بث مع ElevenLabs ليصل الصوت على دفعات أثناء توليده"""
+    response = elevenlabs.post(
+        f"{ELEVENLABS_API_URL}/{tts_request['voice_id']}/stream",
+        headers=_headers(),
+        json=_payload(tts_request),
+        idempotent=True,
+        stream=True,
+    )
+    response.raise_for_status()
+    return response
+
+
+def preview(tts_request):
+    """إرجاع رابط الصوت من الذاكرة أو توليده مرة واحدة
+
+    النص الطويل يُولد جملةً جملة بالتوازي، وتُخزن كل جملة بمفتاحها الخاص
+    فلا يعاد توليد إلا الجمل التي تغيرت.
+    """
+    chunks = split_request(tts_request)
+    if len(chunks) == 1:
+        return audio_cache.url(_ensure_chunk(chunks[0]))
+
+    def join_chunks():
+        return b"".join(_chunk_executor.map(metrics.propagate(_load_chunk), chunks))
+
+    return audio_cache.get_or_create(request_key(tts_request), join_chunks)
+
+
+def stream_to_cache(key, tts_request):
+    """بث الصوت للعميل مع كتابته في الذاكرة في نفس الوقت
+
+    يُفتح الاتصال هنا قبل بدء الاستجابة حتى تظهر أخطاء ElevenLabs كرد JSON عادي.
+    النص الطويل يُبث قطعةً قطعة بالترتيب فور اكتمال كل منها.
+    الطلبات المتزامنة لنفس المفتاح تتابع نفس البث، ويرجع None إذا كان الملف جاهزاً.
+    """
+    return audio_cache.stream(key, lambda: _open_chunks(tts_request))
+
+
+def _open_chunks(tts_request):
+    chunks = split_request(tts_request)
+    if len(chunks) > 1:
+        futures = [_chunk_executor.submit(metrics.propagate(_load_chunk), chunk) for chunk in chunks]
+        # انتظار القطعة الأولى هنا حتى يصل فشلها كرد JSON قبل بدء الاستجابة
+        try:
+            first = futures[0].result()
+        except BaseException:
+            for future in futures[1:]:
+                future.cancel()
+            raise
+
+        def generate():
+            yield first
+            for future in futures[1:]:
+                yield future.result()
+
+        return generate()
+
+    started = time.perf_counter()
+    response = open_stream(tts_request)
+
+    def generate():
+        try:
+            yield from response.iter_content(chunk_size=STREAM_CHUNK_SIZE)
+            metrics.observe_stage("upstream_total", time.perf_counter() - started, elevenlabs.name)
+        finally:
+            response.close()
+
+    return generate()
+
+
+def _chunk_key(chunk):
+    return cache_key(chunk["text"], chunk["voice_id"], chunk["model_id"], chunk["voice_settings"])
+
+
+def _ensure_chunk(chunk):
+    key = _chunk_key(chunk)
+    audio_cache.get_or_create(key, lambda: synthesize(chunk))
+    return key
+
+
+def _load_chunk(chunk):
+    """قراءة صوت القطعة جاهزاً للدمج بعد إزالة الوسوم وإطار Xing/Info"""
+    try:
+        with open(audio_cache.path(_ensure_chunk(chunk)), "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        # أُخلي الملف بين التوليد والقراءة
+        data = synthesize(chunk)
+    return mp3.audio_frames(data)
+
+
+def _headers():
+    return {"xi-api-key": ELEVENLABS_API_KEY, "Content-Type": "application/json"}
+
+
+def _payload(tts_request):
+    return {
+        "text": tts_request["text"],
+        "model_id": tts_request["model_id"],
+        "voice_settings": tts_request["voice_settings"],
+    }
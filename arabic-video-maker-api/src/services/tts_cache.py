@@ -0,0 +1,449 @@
+import os
+import json
+import time
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from src.services import mp3
+from src.services import metrics
+
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", os.path.join(os.path.dirname(__file__), "..", "static", "tts"))
+TTS_CACHE_URL = "/static/tts"
+TTS_CACHE_MAX_BYTES = int(os.getenv("TTS_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+TTS_CACHE_MAX_AGE = float(os.getenv("TTS_CACHE_MAX_AGE", str(7 * 24 * 3600)))
+
+
+def normalize_text(text):
+    """توحيد النص قبل حساب المفتاح حتى لا تختلف النسخ المتطابقة نطقاً"""
+    # التطويل (ـ) زخرفة كتابية لا تغير النطق
+    text = unicodedata.normalize("NFC", text).replace("\u0640", "")
+    return " ".join(text.split())
+
+
+def cache_key(text, voice_id, model_id, voice_settings):
+    """مفتاح المحتوى: بصمة sha256 للطلب بعد توحيده"""
+    payload = {
+        "text": normalize_text(text),
+        "voice_id": voice_id,
+        "model_id": model_id,
+        "voice_settings": voice_settings or {},
+    }
+    encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def is_valid_key(key):
+    """المفاتيح القادمة من الرابط يجب أن تكون بصمة sha256 فقط"""
+    return len(key) == 64 and all(c in "0123456789abcdef" for c in key)
+
+
+def combined_key(keys):
+    """مفتاح ملف مركب من عدة قطع بترتيبها"""
+    return hashlib.sha256(("concat:" + ",".join(keys)).encode("ascii")).hexdigest()
+
+
+class StreamInterrupted(Exception):
+    """انقطع البث قبل اكتماله فلم يُحفظ الملف"""
+
+
+class _Broadcast:
+    """بث جارٍ تُحفظ دفعاته ليتابعه أي عميل آخر يطلب نفس المفتاح"""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._chunks = []
+        self._done = False
+        self._error = None
+
+    def append(self, chunk):
+        with self._cond:
+            self._chunks.append(chunk)
+            self._cond.notify_all()
+
+    def finish(self, error=None):
+        with self._cond:
+            self._done = True
+            self._error = error
+            self._cond.notify_all()
+
+    def wait_started(self):
+        """انتظار أول دفعة، ورفع خطأ المصدر إن فشل قبل أن يبدأ"""
+        with self._cond:
+            self._cond.wait_for(lambda: self._chunks or self._done)
+            if not self._chunks and self._error is not None:
+                raise self._error
+
+    def follow(self):
+        index = 0
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: len(self._chunks) > index or self._done)
+                pending = self._chunks[index:]
+                done = self._done
+            index += len(pending)
+            yield from pending
+            if done:
+                return
+
+
+class _OwnerStream:
+    """دفعات البث لمن فتحه: تُكتب في الذاكرة وتُنشر للمتابعين
+
+    كائن وليس مولداً لأن close() يجب أن ينهي البث للمتابعين حتى لو أغلق العميل الاتصال قبل أول دفعة.
+    """
+
+    def __init__(self, cache, key, chunks, broadcast, future):
+        self._cache = cache
+        self._key = key
+        self._chunks = chunks
+        self._broadcast = broadcast
+        self._future = future
+        self._written = cache.tee(key, chunks)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            chunk = next(self._written)
+        except StopIteration:
+            # tee اعتمد الملف قبل أن ينتهي
+            self._cache._end_stream(self._key, self._broadcast, self._future, None)
+            raise
+        except BaseException as e:
+            self.close(e)
+            raise
+        self._broadcast.append(chunk)
+        return chunk
+
+    def close(self, error=None):
+        # إغلاق tee يحذف الملف المؤقت إن لم يكتمل البث
+        self._written.close()
+        close_source = getattr(self._chunks, "close", None)
+        if close_source is not None:
+            close_source()
+        self._cache._end_stream(self._key, self._broadcast, self._future, error or StreamInterrupted("انقطع بث الصوت قبل اكتماله"))
+
+
+class AudioCache:
+    """ذاكرة تخزين للصوت على القرص مع إخلاء LRU حسب الحجم والعمر"""
+
+    def __init__(self, directory, url_prefix, max_bytes, max_age):
+        self.directory = os.path.abspath(directory)
+        self.url_prefix = url_prefix
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        # key -> (size, created_at) بترتيب آخر استخدام
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._streams = {}
+        self._metadata = {}
+        self._total_bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._inflight_waits = 0
+        self._load()
+
+    def path(self, key):
+        return os.path.join(self.directory, f"{key}.mp3")
+
+    def url(self, key):
+        return f"{self.url_prefix}/{key}.mp3"
+
+    def get_or_create(self, key, producer):
+        """إرجاع رابط الملف المخزن، أو استدعاء producer مرة واحدة فقط لكل مفتاح"""
+        with self._lock:
+            if self._lookup(key):
+                self._hits += 1
+                return self.url(key)
+
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._inflight[key] = future
+                self._misses += 1
+            else:
+                self._inflight_waits += 1
+
+        if not owner:
+            return future.result()
+
+        try:
+            self.store(key, producer())
+            future.set_result(self.url(key))
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+        return self.url(key)
+
+    def stream(self, key, open_chunks):
+        """بث الملف مع حفظه، مرة واحدة فقط لكل مفتاح
+
+        الطلب الأول يستدعي open_chunks ويكتب البث في الذاكرة، والطلبات المتزامنة لنفس المفتاح
+        تتابع نفس الدفعات. يرجع None إذا كان الملف جاهزاً فيُحوَّل العميل إلى رابطه.
+        """
+        with self._lock:
+            if self._lookup(key):
+                return None
+            broadcast = self._streams.get(key)
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                broadcast = self._streams[key] = _Broadcast()
+                future = self._inflight[key] = Future()
+            else:
+                self._inflight_waits += 1
+
+        if not owner:
+            if broadcast is None:
+                # الملف يُولد كاملاً عبر get_or_create فننتظره ثم نحوّل إليه
+                future.result()
+                return None
+            broadcast.wait_started()
+            return broadcast.follow()
+
+        try:
+            chunks = open_chunks()
+        except BaseException as e:
+            self._end_stream(key, broadcast, future, e)
+            raise
+        return _OwnerStream(self, key, chunks, broadcast, future)
+
+    def _end_stream(self, key, broadcast, future, error):
+        with self._lock:
+            if future.done():
+                return
+            self._streams.pop(key, None)
+            self._inflight.pop(key, None)
+            if error is None:
+                future.set_result(self.url(key))
+            else:
+                future.set_exception(error)
+        broadcast.finish(error)
+
+    def store(self, key, data):
+        """كتابة الملف بشكل ذري ثم تسجيله وإخلاء ما زاد عن الحد"""
+        meta = mp3.probe(data)
+        with metrics.timed_stage("disk_write", "tts_cache"):
+            tmp_path = self._tmp_path(self.path(key))
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            self._commit(key, tmp_path, len(data), meta)
+
+    def tee(self, key, chunks):
+        """تمرير الدفعات كما هي مع كتابتها في ملف مؤقت يُعتمد عند اكتمال البث فقط"""
+        tmp_path = self._tmp_path(self.path(key))
+        mp3_probe = mp3.Mp3Probe()
+        size = 0
+        # زمن الكتابة فقط دون انتظار الخدمة أو العميل بين الدفعات
+        write_seconds = 0.0
+        completed = False
+        try:
+            with open(tmp_path, "wb") as f:
+                for chunk in chunks:
+                    if not chunk:
+                        continue
+                    started = time.perf_counter()
+                    f.write(chunk)
+                    write_seconds += time.perf_counter() - started
+                    mp3_probe.feed(chunk)
+                    size += len(chunk)
+                    yield chunk
+            completed = True
+        finally:
+            if completed:
+                started = time.perf_counter()
+                self._commit(key, tmp_path, size, mp3_probe.result())
+                metrics.observe_stage("disk_write", write_seconds + time.perf_counter() - started, "tts_cache")
+                self._discard_request(key)
+            else:
+                # انقطع العميل أو الخدمة قبل الاكتمال فلا نحفظ ملفاً ناقصاً
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+
+    def contains(self, key):
+        """التحقق من وجود الملف واحتسابه كإصابة أو إخفاق"""
+        with self._lock:
+            if self._lookup(key):
+                self._hits += 1
+                return True
+            self._misses += 1
+            return False
+
+    def metadata(self, key):
+        """مدة الصوت ومعدل البت المحسوبة عند الحفظ، دون إعادة قراءة الملف"""
+        with self._lock:
+            meta = self._metadata.get(key)
+        if meta is not None:
+            return meta
+
+        try:
+            with open(self._metadata_path(key), encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            # ملف أقدم من حفظ البيانات الوصفية: نقرؤه مرة واحدة فقط
+            try:
+                meta = mp3.probe_file(self.path(key))
+            except OSError:
+                return None
+            self._write_metadata(key, meta)
+
+        with self._lock:
+            self._metadata[key] = meta
+        return meta
+
+    def save_request(self, key, tts_request):
+        """حفظ معاملات الطلب ليتمكن أي عامل من بثه لاحقاً عبر المفتاح"""
+        tmp_path = self._tmp_path(self._request_path(key))
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(tts_request, f, ensure_ascii=False)
+        os.replace(tmp_path, self._request_path(key))
+
+    def load_request(self, key):
+        try:
+            with open(self._request_path(key), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+                "inflight_waits": self._inflight_waits,
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "max_age": self.max_age,
+            }
+
+    def _request_path(self, key):
+        return os.path.join(self.directory, f"{key}.request.json")
+
+    def _tmp_path(self, path):
+        os.makedirs(self.directory, exist_ok=True)
+        return f"{path}.{threading.get_ident()}.tmp"
+
+    def _metadata_path(self, key):
+        return os.path.join(self.directory, f"{key}.meta.json")
+
+    def _write_metadata(self, key, meta):
+        tmp_path = self._tmp_path(self._metadata_path(key))
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self._metadata_path(key))
+
+    def _commit(self, key, tmp_path, size, meta):
+        # البيانات الوصفية تُكتب أولاً حتى لا يوجد ملف صوت بدونها
+        self._write_metadata(key, meta)
+        os.replace(tmp_path, self.path(key))
+        with self._lock:
+            self._metadata[key] = meta
+            self._add(key, size, time.time())
+            self._evict()
+
+    def _discard_request(self, key):
+        try:
+            os.remove(self._request_path(key))
+        except OSError:
+            pass
+
+    def _lookup(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            # قد يكون عامل آخر قد أنشأ الملف على القرص
+            try:
+                st = os.stat(self.path(key))
+            except OSError:
+                return False
+            self._add(key, st.st_size, st.st_mtime)
+            entry = self._entries[key]
+
+        if time.time() - entry[1] > self.max_age:
+            self._remove(key)
+            self._evictions += 1
+            return False
+
+        self._entries.move_to_end(key)
+        return True
+
+    def _add(self, key, size, created_at):
+        if key in self._entries:
+            self._total_bytes -= self._entries[key][0]
+        self._entries[key] = (size, created_at)
+        self._entries.move_to_end(key)
+        self._total_bytes += size
+
+    def _remove(self, key):
+        size, _ = self._entries.pop(key)
+        self._total_bytes -= size
+        self._metadata.pop(key, None)
+        for path in (self.path(key), self._metadata_path(key)):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _evict(self):
+        now = time.time()
+        for key in [k for k, (_, created_at) in self._entries.items() if now - created_at > self.max_age]:
+            self._remove(key)
+            self._evictions += 1
+
+        while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+            key = next(iter(self._entries))
+            self._remove(key)
+            self._evictions += 1
+
+    def remove_stale(self):
+        """حذف طلبات البث القديمة التي لم تكتمل والملفات المؤقتة المتروكة
+
+        كل العمال يشغلونها عند الإقلاع، فالملف قد يحذفه عامل آخر بين القراءة والحذف.
+        """
+        if not os.path.isdir(self.directory):
+            return
+        now = time.time()
+        for name in os.listdir(self.directory):
+            if name.endswith(".mp3"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                if now - os.stat(path).st_mtime > self.max_age:
+                    os.remove(path)
+            except FileNotFoundError:
+                continue
+
+    def _load(self):
+        """بناء الفهرس من الملفات الموجودة بترتيب تاريخ التعديل"""
+        if not os.path.isdir(self.directory):
+            return
+        found = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".mp3"):
+                continue
+            try:
+                st = os.stat(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                continue
+            found.append((st.st_mtime, name[:-4], st.st_size))
+        for mtime, key, size in sorted(found):
+            self._add(key, size, mtime)
+        with self._lock:
+            self._evict()
+
+
+audio_cache = AudioCache(TTS_CACHE_DIR, TTS_CACHE_URL, TTS_CACHE_MAX_BYTES, TTS_CACHE_MAX_AGE)
@@ -0,0 +1,251 @@
+import os
+import time
+import random
+import threading
+from email.utils import parsedate_to_datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import NewConnectionError
+
+from src.services import metrics
+
+# الحالات التي تستحق إعادة المحاولة: تجاوز الحد أو عطل مؤقت لدى الخدمة
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# للطلبات غير الآمنة للتكرار: الحالات التي تعني أن الخدمة رفضت الطلب قبل تنفيذه فقط
+REJECTED_STATUSES = (429, 503)
+IDEMPOTENT_METHODS = ("GET", "HEAD", "OPTIONS", "PUT", "DELETE")
+
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    """الخدمة معطلة مؤقتاً والقاطع مفتوح فلا نرسل لها طلبات"""
+
+
+class UpstreamBusyError(requests.exceptions.RequestException):
+    """تجاوزنا حد الطلبات المتزامنة المسموح به لهذه الخدمة"""
+
+
+# زمن فتح آخر اتصال جديد في هذا الخيط، فالاتصالات المعاد استخدامها لا تُحتسب
+_connect_time = threading.local()
+
+
+class _TimedHTTPConnection(HTTPConnection):
+    def connect(self):
+        started = time.perf_counter()
+        super().connect()
+        _connect_time.value = time.perf_counter() - started
+
+
+class _TimedHTTPSConnection(HTTPSConnection):
+    def connect(self):
+        # يشمل مصافحة TLS
+        started = time.perf_counter()
+        super().connect()
+        _connect_time.value = time.perf_counter() - started
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class _TimedAdapter(HTTPAdapter):
+    """محول يقيس زمن فتح الاتصالات الجديدة"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {"http": _TimedHTTPConnectionPool, "https": _TimedHTTPSConnectionPool}
+
+
+def _not_connected(error):
+    """فشل الطلب قبل فتح الاتصال، فالخدمة لم تستلمه أصلاً"""
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], "reason", None) if error.args else None
+    return isinstance(reason, NewConnectionError)
+
+
+class CircuitBreaker:
+    """قاطع دائرة بسيط: يفتح بعد عدد من الأخطاء المتتالية ويجرب طلباً واحداً بعد المهلة"""
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if time.monotonic() - self._opened_at >= self.reset_timeout:
+                return "half_open"
+            return "open"
+
+    def allow(self):
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.reset_timeout or self._probing:
+                return False
+            # نصف مفتوح: نسمح بطلب تجريبي واحد فقط
+            self._probing = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._probing = False
+
+
+class UpstreamClient:
+    """عميل HTTP مشترك لخدمة خارجية واحدة مع اتصالات دائمة وإعادة محاولة وحد للتزامن"""
+
+    def __init__(self, name, pool_size=10, connect_timeout=5.0, read_timeout=60.0, max_retries=3,
+                 backoff_base=0.5, backoff_max=20.0, max_concurrency=8, acquire_timeout=30.0,
+                 failure_threshold=5, reset_timeout=30.0):
+        self.name = name
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.acquire_timeout = acquire_timeout
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self._semaphore = threading.BoundedSemaphore(max_concurrency)
+
+        self.session = requests.Session()
+        adapter = _TimedAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    @classmethod
+    def from_env(cls, name, prefix, **defaults):
+        """قراءة الإعدادات من متغيرات البيئة مثل ELEVENLABS_READ_TIMEOUT"""
+        options = dict(defaults)
+        for option, default in list(options.items()):
+            value = os.getenv(f"{prefix}_{option.upper()}")
+            if value is not None:
+                options[option] = type(default)(value)
+        return cls(name, **options)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def request(self, method, url, idempotent=None, **kwargs):
+        """إرسال الطلب مع إعادة المحاولة عند 429/5xx وأخطاء الاتصال
+
+        الطلب غير الآمن للتكرار (POST افتراضياً) يُعاد فقط عند 429/503 أو تعذر فتح الاتصال،
+        لأن 500/502/504 وانقطاع الاتصال بعد الإرسال قد تعني أن الخدمة نفذته فعلاً.
+        لا نعيد المحاولة بعد انتهاء مهلة القراءة لأن الخدمة ربما بدأت بتنفيذ الطلب.
+        حد التزامن يشمل إرسال الطلب واستلام الترويسات فقط، وليس قراءة جسم الرد المبثوث.
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        if idempotent is None:
+            idempotent = method.upper() in IDEMPOTENT_METHODS
+        retry_statuses = RETRY_STATUSES if idempotent else REJECTED_STATUSES
+
+        for attempt in range(self.max_retries + 1):
+            last_attempt = attempt == self.max_retries
+            try:
+                response = self._send(method, url, **kwargs)
+            except requests.exceptions.ConnectionError as e:
+                if last_attempt or not (idempotent or _not_connected(e)):
+                    raise
+                time.sleep(self._backoff(attempt))
+                continue
+
+            if response.status_code not in retry_statuses or last_attempt:
+                return response
+            delay = self._retry_after(response)
+            response.close()
+            time.sleep(delay if delay is not None else self._backoff(attempt))
+
+    def _send(self, method, url, **kwargs):
+        if not self._semaphore.acquire(timeout=self.acquire_timeout):
+            raise UpstreamBusyError(f"{self.name}: عدد الطلبات المتزامنة تجاوز الحد")
+        try:
+            if not self.breaker.allow():
+                raise CircuitOpenError(f"{self.name}: الخدمة غير متاحة مؤقتاً")
+            _connect_time.value = None
+            started = time.perf_counter()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except requests.exceptions.RequestException:
+                self.breaker.record_failure()
+                raise
+            finally:
+                self._observe_connect()
+        finally:
+            self._semaphore.release()
+
+        # elapsed ينتهي عند وصول الترويسات؛ الردود المبثوثة يقيس مستدعيها زمنها الكلي
+        metrics.observe_stage("upstream_first_byte", response.elapsed.total_seconds(), self.name)
+        if not kwargs.get("stream"):
+            metrics.observe_stage("upstream_total", time.perf_counter() - started, self.name)
+
+        if response.status_code in RETRY_STATUSES:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        return response
+
+    def _observe_connect(self):
+        if _connect_time.value is not None:
+            metrics.observe_stage("upstream_connect", _connect_time.value, self.name)
+            _connect_time.value = None
+
+    def _backoff(self, attempt):
+        # تراجع أسي مع عشوائية كاملة حتى لا تعود كل الطلبات في نفس اللحظة
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _retry_after(self, response):
+        value = response.headers.get("Retry-After")
+        if not value:
+            return None
+        try:
+            delay = float(value)
+        except ValueError:
+            try:
+                delay = parsedate_to_datetime(value).timestamp() - time.time()
+            except (TypeError, ValueError):
+                return None
+        return min(max(delay, 0.0), self.backoff_max)
+
+
+elevenlabs = UpstreamClient.from_env(
+    "elevenlabs", "ELEVENLABS",
+    pool_size=10, connect_timeout=5.0, read_timeout=60.0, max_retries=3, max_concurrency=8,
+    failure_threshold=5, reset_timeout=30.0,
+)
+
+stable_diffusion = UpstreamClient.from_env(
+    "stable_diffusion", "STABLE_DIFFUSION",
+    pool_size=10, connect_timeout=5.0, read_timeout=60.0, max_retries=3, max_concurrency=4,
+    failure_threshold=5, reset_timeout=60.0,
+)
+
+# تنزيل مقاطع الفيديو الجاهزة من روابط الخدمة لتجميعها محلياً
+clip_downloads = UpstreamClient.from_env(
+    "clip_downloads", "CLIP_DOWNLOAD",
+    pool_size=16, connect_timeout=5.0, read_timeout=120.0, max_retries=3, max_concurrency=16,
+    failure_threshold=5, reset_timeout=30.0,
+)
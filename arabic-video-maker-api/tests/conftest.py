@@ -0,0 +1,13 @@
+import os
+import sys
+import tempfile
+
+# تشغيل الاختبارات من أي مجلد مع استيراد src كما يفعل الخادم
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+# قاعدة البيانات وملفات الصوت والفيديو في مجلد مؤقت بعيداً عن ملفات التطبيق الحقيقية
+_workdir = tempfile.mkdtemp(prefix="arabic-video-maker-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_workdir, 'test.db')}"
+os.environ["TTS_CACHE_DIR"] = os.path.join(_workdir, "tts")
+os.environ["RENDER_DIR"] = os.path.join(_workdir, "renders")
+os.environ.setdefault("STABLE_DIFFUSION_API_KEY", "test")
@@ -0,0 +1,33 @@
+import base64
+
+import pytest
+
+from src.models.project import Project
+from src.routes.video import _decode_cursor, _encode_cursor
+
+
+def test_round_trip():
+    project = Project(id="6f1c2b1e-8d0a-4c53-9a51-0c6a1f0d2b7e", created_at=1760000000.123456)
+    cursor = _encode_cursor(project)
+    assert _decode_cursor(cursor) == (project.created_at, project.id)
+
+
+def test_cursor_is_url_safe():
+    # معرفات وأوقات تنتج "+" و"/" في base64 العادي
+    for index in range(50):
+        cursor = _encode_cursor(Project(id=f"??>{index}~~", created_at=index + 0.5))
+        assert "+" not in cursor and "/" not in cursor
+
+
+@pytest.mark.parametrize("cursor", [
+    "",
+    "not a cursor!",
+    "مؤشر",
+    base64.urlsafe_b64encode(b"\xff\xfe").decode(),
+    base64.urlsafe_b64encode(b'{"created_at": 1}').decode(),
+    base64.urlsafe_b64encode(b"[1]").decode(),
+    base64.urlsafe_b64encode(b'["soon", "id"]').decode(),
+    base64.urlsafe_b64encode(b"[null, \"id\"]").decode(),
+])
+def test_invalid_cursor(cursor):
+    assert _decode_cursor(cursor) is None
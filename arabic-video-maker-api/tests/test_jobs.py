@@ -0,0 +1,117 @@
+import threading
+import time
+
+import pytest
+from flask import request
+from werkzeug.serving import make_server
+
+from bench.fake_upstreams import create_app
+from src.main import app
+from src.services import jobs
+
+JOB_TIMEOUT = 15
+
+
+@pytest.fixture(scope="module")
+def stub():
+    """خادم Stable Diffusion وهمي مع سجل بالمسارات التي طُلبت منه"""
+    stub_app = create_app(latency=0.0, jitter=0.0, video_ready=0.3)
+    stub_app.requested = []
+
+    @stub_app.before_request
+    def record():
+        stub_app.requested.append(request.path)
+
+    @stub_app.post("/text2video-rejected")
+    def rejected():
+        return {"status": "error", "message": "prompt rejected"}
+
+    @stub_app.post("/text2video-unauthorized")
+    def unauthorized():
+        return {"status": "error"}, 401
+
+    server = make_server("127.0.0.1", 0, stub_app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    stub_app.url = f"http://127.0.0.1:{server.server_port}"
+    yield stub_app
+    server.shutdown()
+
+
+@pytest.fixture
+def client(stub, monkeypatch):
+    monkeypatch.setattr(jobs, "STABLE_DIFFUSION_API_URL", f"{stub.url}/text2video")
+    monkeypatch.setattr(jobs, "STABLE_DIFFUSION_FETCH_URL", f"{stub.url}/fetch")
+    monkeypatch.setattr(jobs, "VIDEO_POLL_INTERVAL", 0.05)
+    return app.test_client()
+
+
+def start_job(client):
+    project = client.post("/api/projects", json={"text": "غروب الشمس على البحر", "voice": "male1"}).get_json()["project"]
+    response = client.post("/api/video/generate", json={"project_id": project["id"]})
+    return project, response
+
+
+def wait_for_status(client, job_id):
+    """متابعة الحالة كما يفعل المتصفح، وإرجاع كل الحالات التي ظهرت بالترتيب"""
+    seen = []
+    deadline = time.monotonic() + JOB_TIMEOUT
+    while time.monotonic() < deadline:
+        data = client.get(f"/api/video/status/{job_id}").get_json()
+        if not seen or seen[-1] != data["status"]:
+            seen.append(data["status"])
+        if data["status"] in ("completed", "failed"):
+            return seen, data
+        time.sleep(0.02)
+    pytest.fail(f"job {job_id} did not finish: {seen}")
+
+
+def test_job_completes_after_polling(client, stub):
+    project, response = start_job(client)
+    assert response.status_code == 202
+    body = response.get_json()
+    assert body["status"] == "queued"
+    assert body["status_url"] == f"/api/video/status/{body['job_id']}"
+
+    seen, data = wait_for_status(client, body["job_id"])
+    assert seen[-1] == "completed"
+    assert "running" in seen
+    assert data["progress"] == 100
+    assert data["error"] is None
+
+    # المتابعة تمت برابط fetch_result الذي أرجعته الخدمة لهذه المهمة
+    with app.app_context():
+        upstream_id = jobs.get_job(body["job_id"]).upstream_id
+    assert f"/fetch/{upstream_id}" in stub.requested
+    assert data["video_url"] == f"{stub.url}/clips/{upstream_id}.mp4"
+
+    projects = client.get("/api/projects").get_json()["projects"]
+    saved = next(p for p in projects if p["id"] == project["id"])
+    assert saved["status"] == "completed"
+    assert saved["video_url"] == data["video_url"]
+
+
+@pytest.mark.parametrize("path, error", [
+    ("/text2video-rejected", "خطأ من API: prompt rejected"),
+    ("/text2video-unauthorized", "مفتاح API غير صحيح أو منتهي الصلاحية"),
+])
+def test_job_fails_with_upstream_error(client, stub, monkeypatch, path, error):
+    monkeypatch.setattr(jobs, "STABLE_DIFFUSION_API_URL", f"{stub.url}{path}")
+    _, response = start_job(client)
+    assert response.status_code == 202
+
+    seen, data = wait_for_status(client, response.get_json()["job_id"])
+    assert seen[-1] == "failed"
+    assert data["error"] == error
+    assert data["video_url"] is None
+
+
+def test_full_queue_returns_503(client, monkeypatch):
+    monkeypatch.setattr(jobs, "_slots", threading.BoundedSemaphore(1))
+    jobs._slots.acquire()
+    _, response = start_job(client)
+    assert response.status_code == 503
+    assert response.get_json()["success"] is False
+
+
+def test_unknown_job_returns_404(client):
+    assert client.get("/api/video/status/missing").status_code == 404
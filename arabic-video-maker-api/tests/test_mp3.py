@@ -0,0 +1,88 @@
+import pytest
+
+from src.services import mp3
+
+# MPEG-1 Layer III بمعدل 128kbps و44.1kHz، ستيريو مشترك
+HEADER = bytes([0xFF, 0xFB, 0x90, 0x64])
+FRAME_SIZE = 417
+FRAME_SECONDS = 1152 / 44100
+
+
+def frame(payload=b"\x00"):
+    # بيانات الصوت تحوي بايتات تشبه المزامنة حتى نتأكد أن المحلل يتخطاها
+    body = (payload * FRAME_SIZE)[:FRAME_SIZE - len(HEADER)]
+    return HEADER + body
+
+
+def info_frame(tag=b"Xing"):
+    data = bytearray(frame())
+    data[36:40] = tag
+    return bytes(data)
+
+
+def id3v2(size=20):
+    return b"ID3\x04\x00\x00" + bytes([0, 0, 0, size]) + bytes(size)
+
+
+ID3V1 = b"TAG" + bytes(125)
+FRAMES = 25
+AUDIO = b"".join(frame(bytes([0xFF, 0xFB, 0x90, 0x64])) for _ in range(FRAMES))
+FILE = id3v2() + info_frame() + AUDIO + ID3V1
+
+
+@pytest.mark.parametrize("header, expected", [
+    (HEADER, (417, 1152, 44100, 2, 36)),
+    # بت الحشو يضيف بايتاً للإطار
+    (bytes([0xFF, 0xFB, 0x92, 0x64]), (418, 1152, 44100, 2, 36)),
+    # MPEG-1 أحادي القناة
+    (bytes([0xFF, 0xFB, 0x90, 0xC4]), (417, 1152, 44100, 1, 21)),
+    # MPEG-2 Layer III بمعدل 64kbps و22.05kHz أحادي
+    (bytes([0xFF, 0xF3, 0x80, 0xC4]), (208, 576, 22050, 1, 13)),
+])
+def test_parse_header(header, expected):
+    assert mp3.parse_header(header) == expected
+
+
+@pytest.mark.parametrize("header", [
+    bytes(4),
+    # إصدار محجوز
+    bytes([0xFF, 0xEB, 0x90, 0x64]),
+    # معدل بت حر ومعدل بت غير صالح
+    bytes([0xFF, 0xFB, 0x00, 0x64]),
+    bytes([0xFF, 0xFB, 0xF0, 0x64]),
+    # معدل عينات غير صالح
+    bytes([0xFF, 0xFB, 0x9C, 0x64]),
+])
+def test_parse_header_rejects_invalid(header):
+    assert mp3.parse_header(header) is None
+
+
+def test_id3v2_size():
+    assert mp3.id3v2_size(id3v2(20)) == 30
+    assert mp3.id3v2_size(AUDIO) == 0
+
+
+def test_probe_skips_tags_and_info_frame():
+    result = mp3.probe(FILE)
+    assert result["frames"] == FRAMES
+    assert result["duration"] == round(FRAMES * FRAME_SECONDS, 3)
+    assert result["bitrate"] == 128
+    assert result["sample_rate"] == 44100
+    assert result["channels"] == 2
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 10, 39, 40, 417, 1000, 4096])
+def test_chunked_feed_matches_probe(chunk_size):
+    probe = mp3.Mp3Probe()
+    for start in range(0, len(FILE), chunk_size):
+        probe.feed(FILE[start:start + chunk_size])
+    assert probe.result() == mp3.probe(FILE)
+
+
+@pytest.mark.parametrize("tag", [b"Xing", b"Info"])
+def test_audio_frames_strips_tags_and_info_frame(tag):
+    assert mp3.audio_frames(id3v2() + info_frame(tag) + AUDIO + ID3V1) == AUDIO
+
+
+def test_audio_frames_keeps_plain_audio():
+    assert mp3.audio_frames(AUDIO) == AUDIO
@@ -0,0 +1,47 @@
+import pytest
+
+from src.services.text_chunker import is_diacritic, split_text
+
+LONG_SENTENCE = "، ".join(["كانت الشمس تغرب ببطء خلف الجبال البعيدة"] * 12) + "."
+
+
+def test_splits_sentences():
+    text = "مرحبا بكم. كيف حالكم؟ أنا بخير!\nشكرا لكم…"
+    assert split_text(text) == ["مرحبا بكم.", "كيف حالكم؟", "أنا بخير!", "شكرا لكم…"]
+
+
+def test_does_not_split_numbers():
+    assert split_text("السعر 3.5 دينار فقط.") == ["السعر 3.5 دينار فقط."]
+
+
+def test_empty_text():
+    assert split_text("") == []
+    assert split_text("  \n ") == []
+
+
+@pytest.mark.parametrize("max_chars", [20, 60, 100])
+def test_long_sentence_fits_limit_and_keeps_words(max_chars):
+    chunks = split_text(LONG_SENTENCE, max_chars)
+    assert len(chunks) > 1
+    assert all(len(chunk) <= max_chars for chunk in chunks)
+    assert " ".join(chunks).split() == LONG_SENTENCE.split()
+
+
+def test_prefers_clause_boundaries():
+    chunks = split_text(LONG_SENTENCE, 100)
+    # كل قطعة عدا الأخيرة تنتهي بفاصلة عربية
+    assert all(chunk.endswith("،") for chunk in chunks[:-1])
+
+
+@pytest.mark.parametrize("word", ["بَ" * 60, "مُحَمَّدٌ" * 15, "قُرْآنٌ" * 20])
+@pytest.mark.parametrize("max_chars", [5, 7, 8, 13])
+def test_never_separates_diacritic_from_letter(word, max_chars):
+    chunks = split_text(word, max_chars)
+    assert "".join(chunks) == word
+    assert all(len(chunk) <= max_chars for chunk in chunks)
+    assert not any(is_diacritic(chunk[0]) for chunk in chunks)
+
+
+def test_is_diacritic():
+    assert all(is_diacritic(char) for char in "ًٌٍَُِّْٰ")
+    assert not any(is_diacritic(char) for char in "ابتة ء،")
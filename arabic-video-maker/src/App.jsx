@@ -30,6 +30,17 @@ function App() {
     { value: 'female2', label: 'عائشة - صوت أنثوي دافئ' }
   ]
 
+  const pollVideoStatus = async (statusUrl) => {
+    while (true) {
+      const statusResponse = await fetch(statusUrl)
+      const statusData = await statusResponse.json()
+      if (!statusData.success || statusData.status === 'completed' || statusData.status === 'failed') {
+        return statusData
+      }
+      await new Promise((resolve) => setTimeout(resolve, 2000))
+    }
+  }
+
   const handleGenerate = async () => {
     setIsGenerating(true)
     setAudioUrl(null)
@@ -60,13 +71,14 @@ function App() {
         headers: {
           'Content-Type': 'application/json',
         },
-        body: JSON.stringify({ text, voice: selectedVoice }),
+        body: JSON.stringify({ text, voice: selectedVoice, stream: true }),
       })
 
       const ttsData = await ttsResponse.json()
 
       if (ttsData.success) {
-        setAudioUrl(ttsData.audio_url)
+        // The stream URL starts playing while ElevenLabs is still synthesizing
+        setAudioUrl(ttsData.stream_url || ttsData.audio_url)
       } else {
         console.error('Error generating audio:', ttsData.error)
         alert(`خطأ في توليد الصوت: ${ttsData.error}`)
@@ -86,7 +98,14 @@ function App() {
       const videoData = await videoResponse.json()
 
       if (videoData.success) {
-        setVideoUrl(videoData.video_url)
+        // Step 4: Poll the background job until the video is ready
+        const statusData = await pollVideoStatus(videoData.status_url)
+        if (statusData.status === 'completed') {
+          setVideoUrl(statusData.video_url)
+        } else {
+          console.error('Error generating video:', statusData.error)
+          alert(`خطأ في توليد الفيديو: ${statusData.error}`)
+        }
       } else {
         console.error('Error generating video:', videoData.error)
         alert(`خطأ في توليد الفيديو: ${videoData.error}`)
@@ -251,6 +270,7 @@ function App() {
                     <div className="text-center text-white">
                       <div className="animate-spin rounded-full h-12 w-12 border-b-2 border-white mx-auto mb-4"></div>
                       <p>جاري إنتاج الفيديو...</p>
+                      {audioUrl && <audio controls autoPlay src={audioUrl} className="w-full mt-4" />}
                     </div>
                   ) : videoUrl ? (
                     <video controls src={videoUrl} className="w-full" />